@@ -1,15 +1,25 @@
+import copy
 import datetime
+import heapq
+import itertools
+import os
+import queue
+import random
 import re
 import shutil
 import threading
+import time
 import traceback
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from contextlib import contextmanager, ExitStack
 from pathlib import Path
-from typing import List, Tuple, Dict, Any, Optional
+from typing import List, Tuple, Dict, Any, Optional, Callable, Iterable, Iterator, Set, NamedTuple
 
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-from watchdog.events import FileSystemEventHandler
+from watchdog.events import FileSystemEventHandler, FileCreatedEvent
 from watchdog.observers import Observer
 from watchdog.observers.polling import PollingObserver
 
@@ -22,7 +32,9 @@ from app.core.config import settings
 from app.core.context import MediaInfo
 from app.core.event import eventmanager, Event
 from app.core.metainfo import MetaInfoPath
+from app.db import SessionFactory
 from app.db.downloadhistory_oper import DownloadHistoryOper
+from app.db.models.transferhistory import TransferHistory
 from app.db.transferhistory_oper import TransferHistoryOper
 from app.helper.directory import DirectoryHelper
 from app.log import logger
@@ -33,7 +45,1337 @@ from app.schemas.types import EventType, MediaType, SystemConfigKey
 from app.utils.string import StringUtils
 from app.utils.system import SystemUtils
 
-lock = threading.Lock()
+
+class KeyedLock:
+    """
+    按键加锁，相同键串行，不同键并行
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 键 -> [锁, 引用计数]
+        self._locks: Dict[Any, list] = {}
+
+    @contextmanager
+    def __call__(self, key: Any):
+        with self._lock:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    self._locks.pop(key, None)
+
+
+class TTLCache:
+    """
+    带过期时间的LRU缓存，同一个键并发加载时只加载一次，并统计命中次数。
+    空结果按较短的过期时间缓存，避免同一批文件反复请求无结果的数据
+    """
+
+    _missing = object()
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600, negative_ttl: float = 0):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        # 空结果的过期时间，为0时不缓存空结果
+        self._negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._loading = KeyedLock()
+        # 键 -> (过期时间, 值)
+        self._data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __get(self, key: Any) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if not item:
+                return self._missing
+            if item[0] < time.monotonic():
+                del self._data[key]
+                return self._missing
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def get(self, key: Any, loader: Callable[[], Any]) -> Any:
+        """
+        读取缓存，未命中时调用loader加载，空结果按negative_ttl缓存
+        """
+        value = self.__get(key)
+        if value is not self._missing:
+            return value
+        with self._loading(key):
+            # 等待期间其它线程可能已加载完成
+            value = self.__get(key)
+            if value is not self._missing:
+                return value
+            with self._lock:
+                self.misses += 1
+            value = loader()
+            ttl = self._ttl if value else self._negative_ttl
+            if ttl > 0:
+                with self._lock:
+                    self._data[key] = (time.monotonic() + ttl, value)
+                    self._data.move_to_end(key)
+                    while len(self._data) > self._maxsize:
+                        self._data.popitem(last=False)
+            return value
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+
+class StageStats:
+    """
+    各处理阶段耗时统计，每个阶段保留最近的样本计算分位数
+    """
+
+    def __init__(self, window: int = 1000):
+        self._window = window
+        self._lock = threading.Lock()
+        # 阶段 -> 最近样本耗时（秒）
+        self._samples: Dict[str, deque] = {}
+        self._counts: Dict[str, int] = {}
+        self._errors: Dict[str, int] = {}
+
+    @contextmanager
+    def timer(self, stage: str):
+        """
+        统计代码块耗时，抛出异常或将 state["error"] 置为True时计为失败
+        """
+        state = {"error": False}
+        start = time.perf_counter()
+        try:
+            yield state
+        except Exception:
+            state["error"] = True
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - start, error=state["error"])
+
+    def record(self, stage: str, seconds: float, error: bool = False):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self._window)
+            samples.append(seconds)
+            self._counts[stage] = self._counts.get(stage, 0) + 1
+            if error:
+                self._errors[stage] = self._errors.get(stage, 0) + 1
+
+    def summary(self) -> Dict[str, dict]:
+        """
+        各阶段次数、失败次数及耗时分位数（毫秒）
+        """
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self._samples.items()}
+            counts, errors = dict(self._counts), dict(self._errors)
+
+        def __percentile(values: list, percent: float) -> float:
+            return round(values[min(int(len(values) * percent), len(values) - 1)] * 1000, 1)
+
+        return {
+            stage: {
+                "count": counts.get(stage, 0),
+                "errors": errors.get(stage, 0),
+                "avg": round(sum(values) / len(values) * 1000, 1),
+                "p50": __percentile(values, 0.5),
+                "p95": __percentile(values, 0.95),
+                "p99": __percentile(values, 0.99),
+            } for stage, values in samples.items() if values
+        }
+
+
+class EventDispatcher:
+    """
+    下游事件异步分发，单线程按提交顺序发送以保证同一媒体的事件顺序，队列满时阻塞提交方
+    """
+
+    _stop = object()
+
+    def __init__(self, send: Callable, stats: StageStats, maxsize: int = 1000):
+        self._send = send
+        self._stats = stats
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stopped = False
+        self._thread = threading.Thread(target=self.__run, name="cloudlinkmonitor-event", daemon=True)
+        self._thread.start()
+
+    def put(self, etype: EventType, data: dict):
+        if self._stopped:
+            # 已停止，直接发送
+            self._send(etype, data)
+            return
+        self._queue.put((time.perf_counter(), etype, data))
+
+    def size(self) -> int:
+        return self._queue.qsize()
+
+    def stop(self, timeout: float = 30):
+        """
+        发送完队列中的事件后停止
+        """
+        self._stopped = True
+        try:
+            self._queue.put(self._stop, timeout=timeout)
+        except queue.Full:
+            logger.warn(f"下游事件队列已满，丢弃 {self._queue.qsize()} 个事件")
+            return
+        self._thread.join(timeout=timeout)
+
+    def __run(self):
+        while True:
+            item = self._queue.get()
+            if item is self._stop:
+                return
+            queued_at, etype, data = item
+            self._stats.record("event_queue", time.perf_counter() - queued_at)
+            try:
+                with self._stats.timer("event_send"):
+                    self._send(etype, data)
+            except Exception as e:
+                logger.error(f"发送事件 {etype} 失败：{str(e)}")
+
+
+class TransferWorkerPool:
+    """
+    有界转移线程池，实时事件优先于全量同步，同一优先级按提交顺序执行；各优先级排队任务达到上限时阻塞提交方。
+    任务内可通过map把子任务分给空闲线程并发执行，子任务优先于同优先级的新任务
+    """
+
+    # 优先级：实时事件、全量/补偿同步
+    REALTIME = 0
+    BACKFILL = 1
+
+    def __init__(self, workers: int, handler: Callable):
+        self._handler = handler
+        self._workers = workers
+        # (优先级, 是否新任务, 序号, Future, 调用)，调用为None时线程退出
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._slots = [threading.BoundedSemaphore(workers * 2) for _ in (self.REALTIME, self.BACKFILL)]
+        self._lock = threading.Lock()
+        self._shutdown = False
+        # 已提交未完成的任务数
+        self._active = 0
+        for index in range(workers):
+            threading.Thread(target=self.__run, name=f"cloudlinkmonitor_{index}", daemon=True).start()
+
+    def submit(self, *args, priority: int = REALTIME, **kwargs) -> Future:
+        """
+        提交任务，处理函数额外收到priority参数
+        """
+        self._slots[priority].acquire()
+        with self._lock:
+            if self._shutdown:
+                self._slots[priority].release()
+                raise RuntimeError("转移线程池已关闭")
+            self._active += 1
+        future = Future()
+        future.add_done_callback(lambda _: self.__done(priority))
+        self._queue.put((priority, 1, next(self._seq), future,
+                         lambda: self._handler(*args, priority=priority, **kwargs)))
+        return future
+
+    def map(self, func: Callable, items: List[Any], priority: int = REALTIME) -> List[Any]:
+        """
+        并发执行 func(item) 并按顺序返回结果。调用方线程同样执行子任务，只等待其它线程已开始执行的子任务，
+        线程池繁忙或已关闭时在调用方线程依次执行完，可在任务内嵌套调用而不会死锁
+        """
+        if len(items) <= 1 or self._workers <= 1:
+            return [func(item) for item in items]
+        cond = threading.Condition()
+        results: List[Any] = [None] * len(items)
+        errors: List[BaseException] = []
+        # 下一个待执行的子任务、执行中的子任务数
+        state = {"next": 0, "running": 0}
+
+        def __work():
+            while True:
+                with cond:
+                    index = state["next"]
+                    if index >= len(items):
+                        return
+                    state["next"] += 1
+                    state["running"] += 1
+                try:
+                    results[index] = func(items[index])
+                except BaseException as e:
+                    errors.append(e)
+                finally:
+                    with cond:
+                        state["running"] -= 1
+                        cond.notify_all()
+
+        with self._lock:
+            if not self._shutdown:
+                for _ in range(min(self._workers, len(items)) - 1):
+                    self._queue.put((priority, 0, next(self._seq), None, __work))
+        __work()
+        with cond:
+            while state["running"]:
+                cond.wait()
+        if errors:
+            raise errors[0]
+        return results
+
+    def active(self) -> int:
+        return self._active
+
+    def shutdown(self):
+        """
+        取消排队中的任务，不等待执行中的任务
+        """
+        with self._lock:
+            self._shutdown = True
+        while True:
+            try:
+                _, _, _, future, _ = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if future:
+                future.cancel()
+        # 优先级最高的结束标记，空闲线程立即退出
+        for _ in range(self._workers):
+            self._queue.put((-1, 0, next(self._seq), None, None))
+
+    def __run(self):
+        while True:
+            _, _, _, future, call = self._queue.get()
+            if call is None:
+                return
+            if future is None:
+                # map的子任务，异常由map抛给调用方
+                call()
+                continue
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = call()
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def __done(self, priority: int):
+        with self._lock:
+            self._active -= 1
+        self._slots[priority].release()
+
+
+class RecognizeScheduler:
+    """
+    识别请求调度，令牌桶限制调用频率，实时事件优先于全量同步取得令牌，调用异常时指数退避重试。
+    识别模块出错时返回空结果而不抛出异常，全量同步识别媒体的空结果也退避重试一次，实时事件不等待
+    """
+
+    def __init__(self, stats: StageStats, rate: float = 4, burst: int = 8,
+                 retries: int = 3, empty_retries: int = 1, backoff: float = 2):
+        self._stats = stats
+        self._rate = rate
+        self._burst = burst
+        self._retries = retries
+        self._empty_retries = empty_retries
+        self._backoff = backoff
+        self._cond = threading.Condition()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        # 各优先级等待令牌的请求数
+        self._waiting = [0, 0]
+
+    def call(self, func: Callable, priority: int = TransferWorkerPool.REALTIME, retry_empty: bool = False) -> Any:
+        """
+        调用识别请求
+        :param func: 请求
+        :param priority: 优先级
+        :param retry_empty: 全量同步时空结果是否重试，只用于识别媒体，集信息等为空是正常结果
+        """
+        for attempt in range(self._retries + 1):
+            with self._stats.timer("recognize_wait"):
+                self.__acquire(priority)
+            try:
+                result = func()
+            except Exception as e:
+                if attempt >= self._retries:
+                    raise
+                reason = str(e) or type(e).__name__
+            else:
+                if result or not retry_empty or priority != TransferWorkerPool.BACKFILL \
+                        or attempt >= self._empty_retries:
+                    return result
+                reason = None
+            delay = self._backoff * 2 ** attempt * random.uniform(0.5, 1)
+            if reason:
+                logger.warn(f"识别请求失败：{reason}，{delay:.1f} 秒后第 {attempt + 1} 次重试")
+            else:
+                logger.debug(f"识别结果为空，{delay:.1f} 秒后第 {attempt + 1} 次重试")
+            time.sleep(delay)
+
+    def __acquire(self, priority: int):
+        """
+        取得一个令牌，有更高优先级的请求等待时让行
+        """
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+                    self._updated = now
+                    if self._tokens >= 1 and not any(self._waiting[:priority]):
+                        self._tokens -= 1
+                        return
+                    # 令牌不足时等到下一个令牌生成，让行时等待通知
+                    self._cond.wait((1 - self._tokens) / self._rate if self._tokens < 1 else None)
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+
+class DebounceQueue:
+    """
+    文件事件防抖队列，按路径合并重复事件，等待文件大小稳定后只分发一次。
+    同一目录下仍有文件在等待时暂缓分发，同一目录的文件合并为一批分发
+    """
+
+    # 等待同目录其它文件的最长时间（防抖时间的倍数）
+    _batch_wait = 10
+
+    def __init__(self, consumer: Callable, delay: float = 3):
+        self._consumer = consumer
+        self._delay = delay
+        self._cond = threading.Condition()
+        # 路径 -> [监控目录, 到期时间, 上次检查的文件大小, 首次事件时间]
+        self._pending: Dict[str, list] = {}
+        self._stopped = False
+        self._thread = threading.Thread(target=self.__run, name="cloudlinkmonitor-debounce", daemon=True)
+        self._thread.start()
+
+    def put(self, path: str, mon_path: str):
+        """
+        加入队列，已在队列中的路径重新计时
+        """
+        with self._cond:
+            entry = self._pending.get(path)
+            if entry:
+                entry[0] = mon_path
+                entry[1] = time.monotonic() + self._delay
+            else:
+                now = time.monotonic()
+                self._pending[path] = [mon_path, now + self._delay, None, now]
+            self._cond.notify()
+
+    def touch(self, path: str):
+        """
+        文件仍在写入，已在队列中的路径重新计时
+        """
+        with self._cond:
+            entry = self._pending.get(path)
+            if entry:
+                entry[1] = time.monotonic() + self._delay
+
+    def size(self) -> int:
+        return len(self._pending)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            if self._pending:
+                logger.info(f"防抖队列停止，丢弃 {len(self._pending)} 个待处理文件")
+            self._pending.clear()
+            self._cond.notify_all()
+
+    def __due(self) -> List[Tuple[str, list]]:
+        """
+        等待并取出到期的路径
+        """
+        with self._cond:
+            while not self._stopped:
+                now = time.monotonic()
+                due = [(path, entry) for path, entry in self._pending.items() if entry[1] <= now]
+                if due:
+                    return due
+                timeout = min((entry[1] for entry in self._pending.values()), default=now + 60) - now
+                self._cond.wait(timeout)
+            return []
+
+    def __run(self):
+        while not self._stopped:
+            due = self.__due()
+            with self._cond:
+                now = time.monotonic()
+                # 仍在等待的目录 -> 最晚到期时间
+                waiting_dirs: Dict[str, float] = {}
+                for path, entry in self._pending.items():
+                    if entry[1] > now:
+                        parent = os.path.dirname(path)
+                        waiting_dirs[parent] = max(entry[1], waiting_dirs.get(parent, 0))
+            ready: Dict[Tuple[str, str], List[str]] = {}
+            for path, entry in due:
+                # 不持锁获取文件大小，网络挂载可能较慢
+                try:
+                    size = os.stat(path).st_size
+                except OSError:
+                    size = None
+                with self._cond:
+                    now = time.monotonic()
+                    if self._pending.get(path) is not entry or entry[1] > now:
+                        # 等待期间有新事件，重新计时
+                        continue
+                    if size is not None and size != entry[2]:
+                        # 文件大小仍在变化，继续等待
+                        entry[2] = size
+                        entry[1] = now + self._delay
+                        continue
+                    parent = os.path.dirname(path)
+                    if size is not None and parent in waiting_dirs \
+                            and now - entry[3] < self._delay * self._batch_wait:
+                        # 同目录还有文件在等待，暂缓到同目录文件一起到期，以便合并为一批
+                        entry[1] = waiting_dirs[parent]
+                        continue
+                    self._pending.pop(path, None)
+                if size is not None:
+                    ready.setdefault((entry[0], parent), []).append(path)
+            for (mon_path, _), paths in ready.items():
+                if self._stopped:
+                    break
+                try:
+                    self._consumer(event_paths=paths, mon_path=mon_path)
+                except Exception as e:
+                    logger.error(f"分发文件 {paths[0]} 等 {len(paths)} 个文件失败：{str(e)}")
+
+
+class ProcessedIndex:
+    """
+    已整理源路径索引，只保存路径哈希。未命中即可判定未处理，命中后仍需查库确认
+    """
+
+    def __init__(self):
+        self._keys: Set[int] = set()
+        self._ready = threading.Event()
+
+    @staticmethod
+    def __key(path: str) -> int:
+        return hash(path.rstrip("/"))
+
+    def load(self, loader: Callable[[], Iterable[str]]):
+        """
+        加载历史记录，加载完成前所有查询都视为可能命中
+        """
+        try:
+            keys = {self.__key(path) for path in loader() if path}
+            self._keys |= keys
+            self._ready.set()
+            logger.info(f"已整理源路径索引加载完成，共 {len(keys)} 条")
+        except Exception as e:
+            logger.error(f"已整理源路径索引加载失败，回退为查询数据库：{str(e)}")
+
+    def add(self, path: str):
+        if path:
+            self._keys.add(self.__key(path))
+
+    def discard(self, path: str):
+        if path:
+            self._keys.discard(self.__key(path))
+
+    def might_contain(self, path: str) -> bool:
+        if not self._ready.is_set():
+            return True
+        return self.__key(path) in self._keys
+
+
+class HistoryCollector(TransferHistoryOper):
+    """
+    复用 TransferHistoryOper.add_success/add_fail 的字段映射，只生成整理历史记录不写库。
+    不经过add_force直接访问数据库时抛出异常
+    """
+
+    class __NoSession:
+        def __getattr__(self, name):
+            raise RuntimeError("整理历史记录收集器不访问数据库")
+
+    def __init__(self):
+        super().__init__(db=self.__NoSession())
+        self.rows: List[TransferHistory] = []
+
+    def add_force(self, **kwargs) -> TransferHistory:
+        kwargs.setdefault("date", time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time())))
+        history = TransferHistory(**kwargs)
+        self.rows.append(history)
+        return history
+
+
+class HistoryWriteBuffer:
+    """
+    整理历史写缓冲，按数量或时间攒批，每批在一个事务中写入。未写入的源路径仍视为已处理
+    """
+
+    def __init__(self, batch_size: int = 50, interval: float = 2):
+        self._batch_size = batch_size
+        self._interval = interval
+        self._cond = threading.Condition()
+        # (是否成功, add_success/add_fail 参数)
+        self._rows: List[Tuple[bool, dict]] = []
+        # 尚未提交的源路径
+        self._pending: Set[str] = set()
+        self._stopped = False
+        self._thread = threading.Thread(target=self.__run, name="cloudlinkmonitor-history", daemon=True)
+        self._thread.start()
+
+    def add(self, success: bool, **kwargs):
+        with self._cond:
+            stopped = self._stopped
+            if not stopped:
+                self._rows.append((success, kwargs))
+                self._pending.add(kwargs["fileitem"].path)
+                if len(self._rows) >= self._batch_size:
+                    self._cond.notify()
+        if stopped:
+            # 写入线程已停止，直接写入
+            self.__write([(success, kwargs)])
+
+    def contains(self, src: str) -> bool:
+        return src in self._pending or f"{src}/" in self._pending
+
+    def size(self) -> int:
+        return len(self._rows)
+
+    def stop(self):
+        """
+        停止并写入剩余记录
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join()
+
+    def __run(self):
+        while True:
+            with self._cond:
+                if not self._rows and not self._stopped:
+                    self._cond.wait()
+                if len(self._rows) < self._batch_size and not self._stopped:
+                    # 攒批，最多等待一个周期
+                    self._cond.wait(self._interval)
+                rows, self._rows = self._rows, []
+                stopped = self._stopped
+            if rows:
+                self.__write(rows)
+                with self._cond:
+                    for _, kwargs in rows:
+                        self._pending.discard(kwargs["fileitem"].path)
+            if stopped:
+                # 停止后add不再追加，剩余记录已在本轮取出
+                return
+
+    @staticmethod
+    def __write(rows: List[Tuple[bool, dict]]):
+        try:
+            # 记录由 add_success/add_fail 生成，字段与逐条写入一致
+            latest = {kwargs["fileitem"].path: (success, kwargs) for success, kwargs in rows}
+            collector = HistoryCollector()
+            for success, kwargs in latest.values():
+                if success:
+                    collector.add_success(**kwargs)
+                else:
+                    collector.add_fail(**kwargs)
+            if len(collector.rows) != len(latest):
+                raise RuntimeError("整理历史记录生成方式已变化")
+            with SessionFactory() as db:
+                # 同一事务中替换同源路径的旧记录并写入，整批只提交一次
+                db.query(TransferHistory).filter(
+                    TransferHistory.src.in_(list(latest.keys()))).delete(synchronize_session=False)
+                db.add_all(collector.rows)
+                db.commit()
+            logger.debug(f"批量写入 {len(rows)} 条整理历史")
+        except Exception as e:
+            logger.warn(f"批量写入整理历史失败，改为逐条写入：{str(e)}")
+            transferhis = TransferHistoryOper()
+            for success, kwargs in rows:
+                try:
+                    if success:
+                        transferhis.add_success(**kwargs)
+                    else:
+                        transferhis.add_fail(**kwargs)
+                except Exception as err:
+                    logger.error(f"写入整理历史 {kwargs['fileitem'].path} 失败：{str(err)}")
+
+
+class EmptyDirCleaner:
+    """
+    移动模式空目录清理。收集转移文件的上级目录，静默一段时间后自底向上统一清理，每个目录只列一次
+    """
+
+    def __init__(self, extensions: List[str], delay: float = 30):
+        self._extensions = {ext.lower() for ext in extensions}
+        self._delay = delay
+        self._lock = threading.Lock()
+        # 候选目录 -> 监控目录
+        self._candidates: Dict[str, str] = {}
+        self._timer: Optional[threading.Timer] = None
+
+    def add(self, file_paths: List[Path], mon_path: str):
+        """
+        加入候选目录，重新计时
+        """
+        with self._lock:
+            for file_path in file_paths:
+                self._candidates[str(file_path.parent)] = mon_path
+            if self._timer:
+                self._timer.cancel()
+            self._timer = threading.Timer(self._delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def stop(self):
+        """
+        立即清理剩余候选目录
+        """
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            candidates, self._candidates = self._candidates, {}
+        if not candidates:
+            return
+        # 候选目录及其上级目录，不含监控目录本身
+        dirs: Set[str] = set()
+        for path, mon_path in candidates.items():
+            mon_len = len(str(Path(mon_path)))
+            for file_dir in [Path(path), *Path(path).parents]:
+                if len(str(file_dir)) <= mon_len:
+                    # 重要，删除到监控目录为止
+                    break
+                dirs.add(str(file_dir))
+        cache: Dict[str, bool] = {}
+        # 自底向上，子目录的结果在父目录检查时复用
+        for file_dir in sorted(dirs, key=lambda x: x.count(os.sep), reverse=True):
+            if not os.path.isdir(file_dir) or self.__has_media(file_dir, cache):
+                continue
+            logger.warn(f"移动模式，删除空目录：{file_dir}")
+            shutil.rmtree(file_dir, ignore_errors=True)
+
+    def __has_media(self, path: str, cache: Dict[str, bool]) -> bool:
+        """
+        目录下是否还有媒体文件或未下载完成的文件
+        """
+        if path in cache:
+            return cache[path]
+        has_media = False
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        has_media = self.__has_media(entry.path, cache)
+                    else:
+                        has_media = os.path.splitext(entry.name)[1].lower() in self._extensions
+                    if has_media:
+                        break
+        except OSError as e:
+            logger.warn(f"无法列出目录 {path}：{str(e)}")
+            has_media = True
+        cache[path] = has_media
+        return has_media
+
+
+class ExcludeMatcher:
+    """
+    排除关键词匹配器，所有关键词合并编译为一个正则，一次扫描完成匹配
+    """
+
+    # 含反向引用、命名分组或全局内联标志的正则合并后语义会变化或无法编译，单独匹配
+    _unmergeable = re.compile(r"\\[1-9]|\(\?P[=<]|^\(\?[aiLmsux]+\)")
+
+    def __init__(self, keywords: Optional[Iterable[str]], flags: int = 0):
+        self.keywords = tuple(keyword for keyword in keywords or [] if keyword)
+        self._flags = flags
+        merged, self._singles = [], []
+        for keyword in self.keywords:
+            try:
+                regex = re.compile(keyword, flags)
+            except re.error as e:
+                logger.warn(f"排除关键词 {keyword} 不是有效的正则表达式：{str(e)}")
+                continue
+            if self._unmergeable.search(keyword):
+                self._singles.append((keyword, regex))
+            else:
+                merged.append(keyword)
+        self._merged = merged
+        self._regex = None
+        if merged:
+            try:
+                self._regex = re.compile("|".join(f"(?:{keyword})" for keyword in merged), flags)
+            except re.error as e:
+                # 合并后无法编译时全部单独匹配
+                logger.warn(f"排除关键词合并编译失败，改为逐个匹配：{str(e)}")
+                self._singles = [(keyword, re.compile(keyword, flags)) for keyword in merged] + self._singles
+                self._merged = []
+
+    def match(self, text: str) -> Optional[str]:
+        """
+        返回命中的关键词，未命中返回None
+        """
+        if self._regex and self._regex.search(text):
+            # 命中后再确认具体关键词，仅用于日志
+            for keyword in self._merged:
+                if re.search(keyword, text, self._flags):
+                    return keyword
+        for keyword, regex in self._singles:
+            if regex.search(text):
+                return keyword
+        return None
+
+
+class SnapshotWalker:
+    """
+    基于目录快照的增量遍历。目录mtime未变化说明其直接子项未增删，沿用快照中的子目录与文件，不再列目录；
+    变化的目录重新列出，只返回新增或大小、修改时间变化的媒体文件。
+    多个线程并行列目录，发现文件即返回，不等待整棵目录树遍历完成。
+    指定since时只返回该时间之后新增或变化的文件，期间未增删子项的目录不再获取文件信息，
+    mtime与快照一致的目录沿用快照中的子目录不再列目录，快照只记录目录结构。
+    部分网络文件系统远程新增文件时不更新目录mtime，不信任mtime时每个目录都重新列出，只按文件大小和修改时间判断变化
+    """
+
+    def __init__(self, extensions: List[str], snapshot: Optional[Dict[str, dict]] = None,
+                 workers: int = 1, record: bool = True, since: Optional[float] = None,
+                 prune: Optional[Iterable[str]] = None, trust_mtime: bool = True):
+        self._extensions = {ext.lower() for ext in extensions}
+        # 目录mtime能否反映子项增删
+        self._trust_mtime = trust_mtime
+        # 不遍历的子目录，如嵌套的其它监控目录
+        self._prune = {os.path.normpath(path) for path in prune or []}
+        self._old = snapshot or {}
+        self._workers = max(workers, 1)
+        self._since = since
+        self._lock = threading.Lock()
+        # since之后移入的目录，其下文件保留原修改时间，需全部返回
+        self._fresh: Set[str] = set()
+        # 本次遍历生成的快照：目录 -> {"mtime": 目录修改时间, "dirs": [子目录名], "files": {文件名: [大小, 修改时间]}}，
+        # 指定since时不含files
+        self.snapshot: Optional[Dict[str, dict]] = {} if record else None
+        # 沿用快照跳过的目录数
+        self.skipped = 0
+        # 无法访问的目录和文件数，不为0时本次遍历不完整
+        self.errors = 0
+
+    def walk(self, root: Path) -> Iterator[Path]:
+        if self._workers == 1:
+            stack = [str(root)]
+            while stack:
+                files, dirs = self.__scan(stack.pop())
+                stack.extend(path for path in dirs if path not in self._prune)
+                yield from files
+            return
+        # 每个目录一个任务，子目录在父目录完成后继续提交；调用方消费慢时只会停止提交新目录
+        with ThreadPoolExecutor(max_workers=self._workers,
+                                thread_name_prefix="cloudlinkmonitor-walk") as executor:
+            pending = {executor.submit(self.__scan, str(root))}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, dirs = future.result()
+                    pending.update(executor.submit(self.__scan, path) for path in dirs if path not in self._prune)
+                    yield from files
+
+    def __scan(self, path: str) -> Tuple[List[Path], List[str]]:
+        """
+        处理一个目录，返回需要处理的文件和待遍历的子目录
+        """
+        try:
+            stat = os.stat(path)
+            mtime = stat.st_mtime
+        except OSError as e:
+            logger.warn(f"无法访问目录 {path}：{str(e)}")
+            self.__error()
+            return [], []
+        if self._since is not None:
+            return self.__scan_since(path, stat)
+        old = self._old.get(path)
+        if self._trust_mtime and old and old.get("mtime") == mtime:
+            with self._lock:
+                if self.snapshot is not None:
+                    self.snapshot[path] = old
+                self.skipped += 1
+            return [], [os.path.join(path, name) for name in old.get("dirs") or []]
+
+        old_files = (old or {}).get("files") or {}
+        files, dirs, changed = {}, [], []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            dirs.append(entry.name)
+                        elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in self._extensions:
+                            stat = entry.stat()
+                            files[entry.name] = [stat.st_size, stat.st_mtime]
+                            if old_files.get(entry.name) != files[entry.name]:
+                                changed.append(Path(entry.path))
+                    except OSError as e:
+                        logger.warn(f"无法访问 {entry.path}：{str(e)}")
+                        self.__error()
+        except OSError as e:
+            logger.warn(f"无法列出目录 {path}：{str(e)}")
+            self.__error()
+            return [], []
+        if self.snapshot is not None:
+            with self._lock:
+                self.snapshot[path] = {"mtime": mtime, "dirs": dirs, "files": files}
+        return changed, [os.path.join(path, name) for name in dirs]
+
+    def __scan_since(self, path: str, stat: os.stat_result) -> Tuple[List[Path], List[str]]:
+        """
+        只处理since之后的变化：目录mtime未超过since说明没有增删子项，只继续遍历子目录，
+        mtime与快照一致时直接沿用快照中的子目录；
+        ctime超过since而mtime未超过说明目录本身是移入的，其下文件全部处理
+        """
+        with self._lock:
+            fresh = os.path.dirname(path) in self._fresh \
+                or stat.st_mtime <= self._since < stat.st_ctime
+            if fresh:
+                self._fresh.add(path)
+        changed = fresh or not self._trust_mtime or stat.st_mtime > self._since
+        old = self._old.get(path)
+        if not changed and old and old.get("mtime") == stat.st_mtime and "dirs" in old:
+            dirs = old.get("dirs") or []
+            with self._lock:
+                if self.snapshot is not None:
+                    self.snapshot[path] = {"mtime": stat.st_mtime, "dirs": dirs}
+                self.skipped += 1
+            return [], [os.path.join(path, name) for name in dirs]
+        files, dirs = [], []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            dirs.append(entry.name)
+                        elif changed and entry.is_file() \
+                                and os.path.splitext(entry.name)[1].lower() in self._extensions:
+                            file_stat = entry.stat()
+                            if fresh or max(file_stat.st_mtime, file_stat.st_ctime) > self._since:
+                                files.append(Path(entry.path))
+                    except OSError as e:
+                        logger.warn(f"无法访问 {entry.path}：{str(e)}")
+                        self.__error()
+        except OSError as e:
+            logger.warn(f"无法列出目录 {path}：{str(e)}")
+            self.__error()
+            return [], []
+        with self._lock:
+            if self.snapshot is not None:
+                self.snapshot[path] = {"mtime": stat.st_mtime, "dirs": dirs}
+            if not changed:
+                self.skipped += 1
+        return files, [os.path.join(path, name) for name in dirs]
+
+    def __error(self):
+        with self._lock:
+            self.errors += 1
+
+    def discard(self, file_path: str):
+        """
+        未处理成功的文件从本次快照中移除，并使所在目录下次重新列出，以便重新处理
+        """
+        if self.snapshot is None:
+            return
+        path, name = os.path.split(file_path)
+        with self._lock:
+            entry = self.snapshot.get(path)
+            if not entry or "files" not in entry:
+                return
+            files = dict(entry["files"])
+            files.pop(name, None)
+            self.snapshot[path] = {**entry, "mtime": None, "files": files}
+
+
+class AdaptivePollingObserver(threading.Thread):
+    """
+    自适应轮询监控，用于网络挂载目录，接口与watchdog的Observer一致。
+    每个目录按各自的间隔检查mtime，有变化时才重新列目录并缩短该目录及上级目录的间隔，
+    长时间无变化的目录逐步退避；监控根目录始终按最短间隔检查。
+    部分网络文件系统远程新增文件时不更新目录mtime，每个目录至少每隔最长间隔重新列一次
+    """
+
+    def __init__(self, min_interval: float = 10, max_interval: float = 300):
+        super().__init__(name="cloudlinkmonitor-poller", daemon=True)
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        # 待建立快照的监控：(响应类, 监控根目录)
+        self._new_watches: List[Tuple[FileSystemEventHandler, str]] = []
+        # 目录 -> {"mtime", "listed", "next", "interval", "dirs", "files", "handler", "root"}
+        self._dirs: Dict[str, dict] = {}
+
+    def schedule(self, event_handler: FileSystemEventHandler, path: str, recursive: bool = True):
+        with self._lock:
+            self._new_watches.append((event_handler, str(path)))
+        return path
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        while not self._stopped.is_set():
+            # 新增的监控先建立初始快照，不产生事件
+            with self._lock:
+                new_watches, self._new_watches = self._new_watches, []
+            for handler, root in new_watches:
+                self.__scan_tree(root, handler=handler, root=root, emit=False)
+            if self._stopped.wait(1):
+                return
+            now = time.monotonic()
+            for path, state in list(self._dirs.items()):
+                if self._stopped.is_set():
+                    return
+                if state["next"] > now or path not in self._dirs:
+                    continue
+                try:
+                    self.__check(path, state)
+                except Exception as e:
+                    logger.debug(f"轮询目录 {path} 出错：{str(e)}")
+
+    def __check(self, path: str, state: dict):
+        """
+        检查一个目录，mtime变化或距上次列目录超过最长间隔时重新列目录
+        """
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            self.__drop_tree(path)
+            return
+        now = time.monotonic()
+        if mtime == state["mtime"] and now - state["listed"] < self._max_interval:
+            # 无变化，退避
+            self.__backoff(path, state, now)
+            return
+        dirs, files = self.__list(path)
+        handler, root = state["handler"], state["root"]
+        for name in files - state["files"]:
+            handler.dispatch(FileCreatedEvent(os.path.join(path, name)))
+        for name in dirs - state["dirs"]:
+            self.__scan_tree(os.path.join(path, name), handler=handler, root=root, emit=True)
+        for name in state["dirs"] - dirs:
+            self.__drop_tree(os.path.join(path, name))
+        changed = mtime != state["mtime"] or dirs != state["dirs"] or files != state["files"]
+        state.update({"mtime": mtime, "dirs": dirs, "files": files, "listed": now})
+        if not changed:
+            # 定期重新列目录未发现变化，继续退避
+            self.__backoff(path, state, now)
+            return
+        state.update({"interval": self._min_interval, "next": now + self._min_interval})
+        # 活跃目录的上级目录也缩短间隔
+        parent = self._dirs.get(os.path.dirname(path))
+        if parent and path != root:
+            parent["interval"] = self._min_interval
+            parent["next"] = min(parent["next"], now + self._min_interval)
+
+    def __backoff(self, path: str, state: dict, now: float):
+        """
+        目录无变化，加倍检查间隔，监控根目录除外
+        """
+        if path != state["root"]:
+            state["interval"] = min(state["interval"] * 2, self._max_interval)
+        state["next"] = now + state["interval"]
+
+    def __scan_tree(self, top: str, handler: FileSystemEventHandler, root: str, emit: bool):
+        """
+        记录目录树快照，emit为True时新文件产生创建事件
+        """
+        stack = [top]
+        while stack and not self._stopped.is_set():
+            path = stack.pop()
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+            dirs, files = self.__list(path)
+            if emit:
+                for name in files:
+                    handler.dispatch(FileCreatedEvent(os.path.join(path, name)))
+            self._dirs[path] = {"mtime": mtime, "listed": time.monotonic(), "dirs": dirs, "files": files,
+                                "interval": self._min_interval,
+                                "next": time.monotonic() + self._min_interval,
+                                "handler": handler, "root": root}
+            stack.extend(os.path.join(path, name) for name in dirs)
+
+    def __drop_tree(self, top: str):
+        """
+        移除已删除目录的快照
+        """
+        prefix = top + os.sep
+        for path in [path for path in self._dirs if path == top or path.startswith(prefix)]:
+            self._dirs.pop(path, None)
+
+    @staticmethod
+    def __list(path: str) -> Tuple[Set[str], Set[str]]:
+        dirs, files = set(), set()
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.add(entry.name)
+                    else:
+                        files.add(entry.name)
+        except OSError as e:
+            logger.debug(f"无法列出目录 {path}：{str(e)}")
+        return dirs, files
+
+
+class MediaAggregator:
+    """
+    入库消息汇总，按 媒体+季 聚合。每个文件只保留大小和集数，媒体信息每个键只保留一份；
+    按到期时间的小根堆只取出已到期的键，文件数超过上限时提前取出最早到期的键。
+    put可多线程调用，只进入无锁队列；汇总结构只由pop_due的单一消费者读写
+    """
+
+    def __init__(self, interval: float, max_files: int = 5000):
+        self._interval = interval
+        self._max_files = max_files
+        # 待汇总的文件记录
+        self._incoming = queue.SimpleQueue()
+        # 键 -> {"files": {路径: (大小, 集数)}, "mediainfo", "file_meta", "transferinfo", "due": 到期时间}
+        self._items: Dict[str, dict] = {}
+        # (到期时间, 键)，键更新后旧条目留在堆中，取出时按到期时间比对丢弃
+        self._heap: List[Tuple[float, str]] = []
+        self._files = 0
+
+    def put(self, key: str, path: str, size: int, episode: Optional[int],
+            mediainfo: MediaInfo, file_meta: MetaInfoPath, transferinfo: TransferInfo):
+        self._incoming.put((key, path, size, episode, mediainfo, file_meta, transferinfo, time.monotonic()))
+
+    def __add(self, key: str, path: str, size: int, episode: Optional[int],
+              mediainfo: MediaInfo, file_meta: MetaInfoPath, transferinfo: TransferInfo, now: float):
+        item = self._items.get(key)
+        if not item:
+            item = self._items[key] = {"files": {}, "mediainfo": mediainfo,
+                                       "file_meta": file_meta, "transferinfo": transferinfo}
+        if path not in item["files"]:
+            item["files"][path] = (size, episode)
+            self._files += 1
+        # 电影立即到期，剧集等待同一季的其它集
+        item["due"] = max(item.get("due") or 0,
+                          now + (0 if mediainfo.type == MediaType.MOVIE else self._interval))
+        heapq.heappush(self._heap, (item["due"], key))
+        if len(self._heap) > 2 * len(self._items) + 64:
+            # 过期条目过多时重建堆
+            self._heap = [(value["due"], name) for name, value in self._items.items()]
+            heapq.heapify(self._heap)
+
+    def full(self) -> bool:
+        return self.size() > self._max_files
+
+    def size(self) -> int:
+        return self._files + self._incoming.qsize()
+
+    def pop_due(self, force: bool = False) -> List[dict]:
+        """
+        取出已到期的键，超过上限时继续取出最早到期的键
+        :param force: 取出全部
+        """
+        while True:
+            try:
+                record = self._incoming.get_nowait()
+            except queue.Empty:
+                break
+            self.__add(*record)
+        now = time.monotonic()
+        due = []
+        while self._heap and (force or self._heap[0][0] <= now or self._files > self._max_files):
+            due_at, key = heapq.heappop(self._heap)
+            item = self._items.get(key)
+            if not item or item["due"] != due_at:
+                continue
+            del self._items[key]
+            self._files -= len(item["files"])
+            due.append(item)
+        return due
+
+
+class ObserverPool:
+    """
+    共享监控线程池，同类监控最多使用预算数量的Observer，监控目录轮流分配
+    """
+
+    def __init__(self, budget: int):
+        self._budget = max(budget, 1)
+        # 类型 -> Observer列表
+        self._observers: Dict[str, list] = {}
+        self._next: Dict[str, int] = {}
+
+    def schedule(self, kind: str, factory: Callable, event_handler: FileSystemEventHandler, path: str):
+        observers = self._observers.setdefault(kind, [])
+        if len(observers) < self._budget:
+            observer = factory()
+            observer.daemon = True
+            observer.start()
+            observers.append(observer)
+        else:
+            index = self._next.get(kind, 0)
+            self._next[kind] = index + 1
+            observer = observers[index % len(observers)]
+        observer.schedule(event_handler, path=path, recursive=True)
+
+    def size(self) -> int:
+        return sum(len(observers) for observers in self._observers.values())
+
+    def stop(self):
+        """
+        先全部通知停止再等待退出，缩短重启时间
+        """
+        observers = [observer for items in self._observers.values() for observer in items]
+        for observer in observers:
+            try:
+                observer.stop()
+            except Exception as e:
+                logger.debug(str(e))
+        for observer in observers:
+            try:
+                observer.join()
+            except Exception as e:
+                logger.debug(str(e))
+        self._observers = {}
+
+
+class Route(NamedTuple):
+    """
+    监控目录路由
+    """
+    # 监控目录
+    path: str
+    # 目的目录
+    target: Optional[Path]
+    # 转移方式
+    transfer_type: Optional[str]
+    # 覆盖方式
+    overwrite_mode: str
+    # 最小文件大小（GB）
+    size: float
+
+
+class RoutingTable:
+    """
+    监控目录路由表，按目录层级构建前缀树，文件路径按层级查找最近一级监控目录
+    """
+
+    def __init__(self):
+        # 节点：[子节点 {目录名: 节点}, 路由]
+        self._root: list = [{}, None]
+        self._routes: Dict[str, Route] = {}
+
+    @staticmethod
+    def parse(line: str, transfer_type: Optional[str], size: float) -> Optional[Route]:
+        """
+        解析一行监控目录配置，格式：源目录:目的目录#转移方式@覆盖方式
+        :param line: 配置行
+        :param transfer_type: 默认转移方式
+        :param size: 最小文件大小（GB）
+        """
+        if not line:
+            return None
+        # 自定义覆盖方式
+        overwrite_mode = 'never'
+        if line.count("@") == 1:
+            line, overwrite_mode = line.split("@")
+        # 自定义转移方式
+        if line.count("#") == 1:
+            line, transfer_type = line.split("#")
+        # 目的目录
+        if SystemUtils.is_windows():
+            if line.count(":") > 1:
+                paths = [line.split(":")[0] + ":" + line.split(":")[1],
+                         line.split(":")[2] + ":" + line.split(":")[3]]
+            else:
+                paths = [line]
+        else:
+            paths = line.split(":")
+        return Route(path=paths[0],
+                     target=Path(paths[1]) if len(paths) > 1 else None,
+                     transfer_type=transfer_type,
+                     overwrite_mode=overwrite_mode,
+                     size=size)
+
+    @staticmethod
+    def __parts(path: str) -> List[str]:
+        return [part for part in os.path.normpath(path).split(os.sep) if part]
+
+    def add(self, route: Route):
+        """
+        加入路由，重复或嵌套的监控目录记录日志，文件按最近一级监控目录处理
+        """
+        node = self._root
+        for part in self.__parts(route.path):
+            if node[1] and node[1].path != route.path:
+                logger.warn(f"监控目录 {route.path} 位于监控目录 {node[1].path} 下，其中的文件按 {route.path} 的配置处理")
+            node = node[0].setdefault(part, [{}, None])
+        if node[1]:
+            logger.warn(f"监控目录 {route.path} 重复配置，使用最后一条配置")
+            self._routes.pop(node[1].path, None)
+        else:
+            stack = list(node[0].values())
+            while stack:
+                child = stack.pop()
+                if child[1]:
+                    logger.warn(f"监控目录 {route.path} 包含监控目录 {child[1].path}，其中的文件按 {child[1].path} 的配置处理")
+                stack.extend(child[0].values())
+        node[1] = route
+        self._routes[route.path] = route
+
+    def get(self, path: str) -> Optional[Route]:
+        return self._routes.get(path)
+
+    def resolve(self, file_path: str) -> Optional[Route]:
+        """
+        文件所属的最近一级监控目录路由
+        """
+        node = self._root
+        route = None
+        for part in self.__parts(file_path):
+            node = node[0].get(part)
+            if not node:
+                break
+            if node[1]:
+                route = node[1]
+        return route
+
+    def paths(self) -> List[str]:
+        return list(self._routes.keys())
+
+    def nested(self, path: str) -> List[str]:
+        """
+        位于该监控目录下的其它监控目录
+        """
+        node = self._root
+        for part in self.__parts(path):
+            node = node[0].get(part)
+            if not node:
+                return []
+        nested, stack = [], list(node[0].values())
+        while stack:
+            child = stack.pop()
+            if child[1]:
+                nested.append(child[1].path)
+            stack.extend(child[0].values())
+        return nested
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._routes
+
+    def __len__(self) -> int:
+        return len(self._routes)
 
 
 class FileMonitorHandler(FileSystemEventHandler):
@@ -54,6 +1396,9 @@ class FileMonitorHandler(FileSystemEventHandler):
         self.sync.event_handler(event=event, text="移动",
                                 mon_path=self._watch_path, event_path=event.dest_path)
 
+    def on_modified(self, event):
+        self.sync.event_touch(event=event, event_path=event.src_path)
+
 
 class CloudLinkMonitor(_PluginBase):
     # 插件名称
@@ -63,7 +1408,7 @@ class CloudLinkMonitor(_PluginBase):
     # 插件图标
     plugin_icon = "Linkease_A.png"
     # 插件版本
-    plugin_version = "2.6.0"
+    plugin_version = "2.8.0"
     # 插件作者
     plugin_author = "fromthsrite"
     # 作者主页
@@ -82,7 +1427,11 @@ class CloudLinkMonitor(_PluginBase):
     transferchian = None
     tmdbchain = None
     storagechain = None
-    _observer = []
+    _observer: Optional[ObserverPool] = None
+    # 监控线程数
+    _observer_threads: int = 4
+    # 启动补偿扫描的时间余量（秒），兼容网络挂载的时间精度与时钟偏差
+    _catch_up_slack = 60
     _enabled = False
     _notify = False
     _onlyonce = False
@@ -96,19 +1445,78 @@ class CloudLinkMonitor(_PluginBase):
     filetransfer = None
     mediaChain = None
     _size = 0
-    # 模式 compatibility/fast
+    # 模式 compatibility/fast/auto
     _mode = "compatibility"
+    # 网络挂载文件系统类型（前缀匹配）
+    _remote_fstypes = ("cifs", "smb", "nfs", "9p", "davfs", "afpfs", "glusterfs", "ceph")
+    # 网络挂载的FUSE文件系统子类型，fuseblk(NTFS)、mergerfs等本地FUSE不在其中
+    _remote_fuse_types = ("fuse.rclone", "fuse.sshfs", "fuse.s3fs", "fuse.alist", "fuse.clouddrive",
+                          "fuse.clouddrive2", "fuse.juicefs", "fuse.gcsfuse", "fuse.goofys", "fuse.davfs2",
+                          "fuse.webdavfs", "fuse.glusterfs", "fuse.cephfs", "fuse.geesefs")
     # 转移方式
     _transfer_type = "softlink"
     _monitor_dirs = ""
     _exclude_keywords = ""
     _interval: int = 10
-    # 存储源目录与目的目录关系
-    _dirconf: Dict[str, Optional[Path]] = {}
-    # 存储源目录转移方式
-    _transferconf: Dict[str, Optional[str]] = {}
-    _overwrite_mode: Dict[str, Optional[str]] = {}
-    _medias = {}
+    # 并发转移数
+    _workers: int = 4
+    # 事件防抖时间（秒）
+    _debounce: float = 3
+    # 增量同步
+    _incremental = False
+    # 监控目录路由表
+    _routes: RoutingTable = RoutingTable()
+    # 入库消息汇总
+    _medias: Optional[MediaAggregator] = None
+    # 转移线程池
+    _pool: Optional[TransferWorkerPool] = None
+    # 事件防抖队列
+    _queue: Optional[DebounceQueue] = None
+    # 已整理源路径索引
+    _processed: Optional[ProcessedIndex] = None
+    # 整理历史写缓冲
+    _history_buffer: Optional[HistoryWriteBuffer] = None
+    # 各阶段耗时统计
+    _stats: Optional[StageStats] = None
+    # 下游事件分发
+    _dispatcher: Optional[EventDispatcher] = None
+    # 移动模式空目录清理
+    _cleaner: Optional[EmptyDirCleaner] = None
+    # 统计阶段名称
+    _stage_names = {
+        "lock_wait": "等待源文件锁",
+        "get_file_item": "查找文件项",
+        "recognize_media": "识别媒体信息",
+        "tmdb_episodes": "获取集信息",
+        "get_dir": "查询目的目录",
+        "transfer": "转移文件",
+        "scrape_metadata": "刮削",
+        "event_queue": "事件排队",
+        "event_send": "发送事件",
+        "recognize_wait": "识别排队",
+    }
+    # 过滤关键字、整理屏蔽词匹配器
+    _exclude_matcher: Optional[ExcludeMatcher] = None
+    _transfer_exclude_matcher: Optional[ExcludeMatcher] = None
+    # 识别结果、集信息、历史标题缓存
+    _recognize_cache: Optional[TTLCache] = None
+    _episodes_cache: Optional[TTLCache] = None
+    _title_cache: Optional[TTLCache] = None
+    # 识别请求调度
+    _recognizer: Optional[RecognizeScheduler] = None
+    # 识别请求每秒次数、突发次数
+    _recognize_rate: float = 4.0
+    _recognize_burst: int = 8
+    # 查重锁，全局串行
+    _dedupe_lock = threading.Lock()
+    # 源文件锁、目的目录锁
+    _source_lock = KeyedLock()
+    _dest_lock = KeyedLock()
+    # 消息汇总消费锁，同一时间只有一个线程取出汇总
+    _medias_lock = threading.Lock()
+    # 正在进行的同步与补偿扫描数，期间不推进已处理时间
+    _scans: int = 0
+    _scans_lock = threading.Lock()
     # 退出事件
     _event = threading.Event()
 
@@ -120,11 +1528,6 @@ class CloudLinkMonitor(_PluginBase):
         self.mediaChain = MediaChain()
         self.storagechain = StorageChain()
         self.filetransfer = FileManagerModule()
-        # 清空配置
-        self._dirconf = {}
-        self._transferconf = {}
-        self._overwrite_mode = {}
-
         # 读取配置
         if config:
             self._enabled = config.get("enabled")
@@ -139,64 +1542,81 @@ class CloudLinkMonitor(_PluginBase):
             self._monitor_dirs = config.get("monitor_dirs") or ""
             self._exclude_keywords = config.get("exclude_keywords") or ""
             self._interval = config.get("interval") or 10
+            self._workers = self.__number(config.get("workers"), 4)
+            self._debounce = self.__number(config.get("debounce"), 3.0)
+            self._incremental = config.get("incremental")
+            self._observer_threads = self.__number(config.get("observer_threads"), 4)
+            self._recognize_rate = self.__number(config.get("recognize_rate"), 4.0)
+            self._recognize_burst = self.__number(config.get("recognize_burst"), 8)
             self._cron = config.get("cron")
             self._size = config.get("size") or 0
             self._softlink = config.get("softlink")
             self._strm = config.get("strm")
 
-        # 停止现有任务
+        # 停止现有任务，停止时按原配置记录已处理到的时间
         self.stop_service()
+        # 清空配置
+        self._routes = RoutingTable()
+
+        # 编译过滤关键字，整理屏蔽词在首次使用及系统设置变化时编译
+        self._exclude_matcher = ExcludeMatcher(self._exclude_keywords.split("\n"))
+        self._transfer_exclude_matcher = None
 
         if self._enabled or self._onlyonce:
+            # 停用时不创建以下后台线程，也不加载整理历史
+
+            # 识别缓存，同一季的文件只识别一次
+            self._recognize_cache = TTLCache(maxsize=1024, ttl=3600, negative_ttl=300)
+            self._episodes_cache = TTLCache(maxsize=1024, ttl=3600, negative_ttl=300)
+            self._title_cache = TTLCache(maxsize=4096, ttl=3600)
+
+            # 后台加载已整理源路径索引
+            self._processed = ProcessedIndex()
+            threading.Thread(target=self._processed.load, args=(self.__load_processed,),
+                             name="cloudlinkmonitor-index", daemon=True).start()
+
+            # 整理历史写缓冲
+            self._history_buffer = HistoryWriteBuffer()
+            # 各阶段耗时统计
+            self._stats = StageStats()
+            # 移动模式空目录延迟清理
+            self._cleaner = EmptyDirCleaner(extensions=settings.RMT_MEDIAEXT + settings.DOWNLOAD_TMPEXT)
+            # 入库消息汇总
+            self._medias = MediaAggregator(interval=int(self._interval))
+            # 下游事件异步分发，慢订阅者不阻塞转移
+            self._dispatcher = EventDispatcher(send=self.eventmanager.send_event, stats=self._stats)
+
+            # 识别请求限速，实时事件优先
+            self._recognizer = RecognizeScheduler(stats=self._stats, rate=max(self._recognize_rate, 0.1),
+                                                  burst=max(self._recognize_burst, 1))
+            # 转移线程池
+            self._pool = TransferWorkerPool(workers=max(self._workers, 1), handler=self.__handle_files)
+
             # 定时服务管理器
             self._scheduler = BackgroundScheduler(timezone=settings.TZ)
             if self._notify:
                 # 追加入库消息统一发送服务
                 self._scheduler.add_job(self.send_msg, trigger='interval', seconds=15)
 
+            if self._enabled:
+                # 监控事件先进入防抖队列，文件稳定后再提交转移线程池
+                self._queue = DebounceQueue(consumer=self._pool.submit, delay=self._debounce)
+                # 定期记录已处理到的时间
+                self._scheduler.add_job(self.__save_watermark, trigger='interval', seconds=60)
+
             # 读取目录配置
             monitor_dirs = self._monitor_dirs.split("\n")
             if not monitor_dirs:
                 return
-            for mon_path in monitor_dirs:
-                # 格式源目录:目的目录
-                if not mon_path:
+            # 需要启用监控的目录
+            watch_paths = []
+            for line in monitor_dirs:
+                # 格式源目录:目的目录#转移方式@覆盖方式
+                route = RoutingTable.parse(line, transfer_type=self._transfer_type, size=float(self._size or 0))
+                if not route:
                     continue
-
-                # 自定义覆盖方式
-                _overwrite_mode = 'never'
-                if mon_path.count("@") == 1:
-                    _overwrite_mode = mon_path.split("@")[1]
-                    mon_path = mon_path.split("@")[0]
-
-                # 自定义转移方式
-                _transfer_type = self._transfer_type
-                if mon_path.count("#") == 1:
-                    _transfer_type = mon_path.split("#")[1]
-                    mon_path = mon_path.split("#")[0]
-
-                # 存储目的目录
-                if SystemUtils.is_windows():
-                    if mon_path.count(":") > 1:
-                        paths = [mon_path.split(":")[0] + ":" + mon_path.split(":")[1],
-                                 mon_path.split(":")[2] + ":" + mon_path.split(":")[3]]
-                    else:
-                        paths = [mon_path]
-                else:
-                    paths = mon_path.split(":")
-
-                # 目的目录
-                target_path = None
-                if len(paths) > 1:
-                    mon_path = paths[0]
-                    target_path = Path(paths[1])
-                    self._dirconf[mon_path] = target_path
-                else:
-                    self._dirconf[mon_path] = None
-
-                # 转移方式
-                self._transferconf[mon_path] = _transfer_type
-                self._overwrite_mode[mon_path] = _overwrite_mode
+                self._routes.add(route)
+                mon_path, target_path = route.path, route.target
 
                 # 启用目录监控
                 if self._enabled:
@@ -209,38 +1629,46 @@ class CloudLinkMonitor(_PluginBase):
                     except Exception as e:
                         logger.debug(str(e))
                         pass
+                    watch_paths.append(mon_path)
 
-                    try:
-                        if self._mode == "compatibility":
-                            # 兼容模式，目录同步性能降低且NAS不能休眠，但可以兼容挂载的远程共享目录如SMB
-                            observer = PollingObserver(timeout=10)
-                        else:
-                            # 内部处理系统操作类型选择最优解
-                            observer = Observer(timeout=10)
-                        self._observer.append(observer)
-                        observer.schedule(FileMonitorHandler(mon_path, self), path=mon_path, recursive=True)
-                        observer.daemon = True
-                        observer.start()
-                        logger.info(f"{mon_path} 的云盘实时监控服务启动")
-                    except Exception as e:
-                        err_msg = str(e)
-                        if "inotify" in err_msg and "reached" in err_msg:
-                            logger.warn(
-                                f"云盘实时监控服务启动出现异常：{err_msg}，请在宿主机上（不是docker容器内）执行以下命令并重启："
-                                + """
-                                     echo fs.inotify.max_user_watches=524288 | sudo tee -a /etc/sysctl.conf
-                                     echo fs.inotify.max_user_instances=524288 | sudo tee -a /etc/sysctl.conf
-                                     sudo sysctl -p
-                                     """)
-                        else:
-                            logger.error(f"{mon_path} 启动目云盘实时监控失败：{err_msg}")
-                        self.systemmessage.put(f"{mon_path} 启动云盘实时监控失败：{err_msg}")
+            # 所有监控目录共用监控线程池，嵌套的同类监控目录只监控最外层，事件按最近的监控目录处理
+            self._observer = ObserverPool(budget=self._observer_threads)
+            kinds = {mon_path: self.__watch_kind(mon_path) for mon_path in watch_paths}
+            for mon_path in self.__outermost_paths(kinds):
+                try:
+                    kind = kinds[mon_path]
+                    if kind == "polling":
+                        # 兼容模式，目录同步性能降低且NAS不能休眠，但可以兼容挂载的远程共享目录如SMB
+                        factory = lambda: PollingObserver(timeout=10)
+                    elif kind == "adaptive":
+                        # 智能模式，网络挂载目录使用自适应轮询，无变化的目录逐步降低检查频率
+                        logger.info(f"{mon_path} 是网络挂载目录，使用自适应轮询监控")
+                        factory = AdaptivePollingObserver
+                    else:
+                        # 内部处理系统操作类型选择最优解
+                        factory = lambda: Observer(timeout=10)
+                    self._observer.schedule(kind=kind, factory=factory,
+                                            event_handler=FileMonitorHandler(mon_path, self), path=mon_path)
+                    logger.info(f"{mon_path} 的云盘实时监控服务启动")
+                except Exception as e:
+                    err_msg = str(e)
+                    if "inotify" in err_msg and "reached" in err_msg:
+                        logger.warn(
+                            f"云盘实时监控服务启动出现异常：{err_msg}，请在宿主机上（不是docker容器内）执行以下命令并重启："
+                            + """
+                                 echo fs.inotify.max_user_watches=524288 | sudo tee -a /etc/sysctl.conf
+                                 echo fs.inotify.max_user_instances=524288 | sudo tee -a /etc/sysctl.conf
+                                 sudo sysctl -p
+                                 """)
+                    else:
+                        logger.error(f"{mon_path} 启动目云盘实时监控失败：{err_msg}")
+                    self.systemmessage.put(f"{mon_path} 启动云盘实时监控失败：{err_msg}")
 
             # 运行一次定时服务
             if self._onlyonce:
                 logger.info("云盘实时监控服务启动，立即运行一次")
                 self._scheduler.add_job(name="云盘实时监控",
-                                        func=self.sync_all, trigger='date',
+                                        func=self.sync_all, kwargs={"full": True}, trigger='date',
                                         run_date=datetime.datetime.now(
                                             tz=pytz.timezone(settings.TZ)) + datetime.timedelta(seconds=3)
                                         )
@@ -248,12 +1676,85 @@ class CloudLinkMonitor(_PluginBase):
                 self._onlyonce = False
                 # 保存配置
                 self.__update_config()
+            elif self._enabled and self._observer:
+                # 补偿插件停止期间遗漏的文件
+                self._scheduler.add_job(name="云盘实时监控补偿扫描",
+                                        func=self.catch_up, trigger='date',
+                                        run_date=datetime.datetime.now(
+                                            tz=pytz.timezone(settings.TZ)) + datetime.timedelta(seconds=3)
+                                        )
 
             # 启动定时服务
             if self._scheduler.get_jobs():
                 self._scheduler.print_jobs()
                 self._scheduler.start()
 
+    @staticmethod
+    def __number(value: Any, default):
+        """
+        读取数字配置，为空或不是数字时使用默认值
+        :param value: 配置值
+        :param default: 默认值，结果与默认值类型相同
+        """
+        if value in (None, ""):
+            return default
+        try:
+            return type(default)(value)
+        except (TypeError, ValueError):
+            logger.warn(f"配置值 {value} 不是有效的数字，使用默认值 {default}")
+            return default
+
+    @staticmethod
+    def __outermost_paths(kinds: Dict[str, str]) -> List[str]:
+        """
+        去除重复及嵌套在同类监控目录下的目录，挂载类型不同的嵌套目录（如本地目录下挂载的网盘）单独监控
+        :param kinds: 监控目录 -> 监控方式
+        """
+        outermost: List[str] = []
+        for path in sorted(kinds, key=len):
+            # 最近的上级监控目录
+            parent = max((root for root in outermost if Path(path).is_relative_to(Path(root))), key=len, default=None)
+            if parent and kinds[parent] == kinds[path]:
+                logger.info(f"监控目录 {path} 位于 {parent} 下，共用 {parent} 的监控")
+                continue
+            if parent:
+                logger.info(f"监控目录 {path} 位于 {parent} 下，但监控方式不同，单独监控")
+            outermost.append(path)
+        return outermost
+
+    def __watch_kind(self, mon_path: str) -> str:
+        """
+        监控目录使用的监控方式：polling 兼容模式轮询，adaptive 自适应轮询，inotify 系统文件事件
+        """
+        if self._mode == "compatibility":
+            return "polling"
+        if self._mode == "auto" and self.__is_remote(mon_path):
+            return "adaptive"
+        return "inotify"
+
+    def __is_remote(self, path: str) -> bool:
+        """
+        根据/proc/mounts判断目录是否位于网络挂载（fuse/rclone/cifs/nfs等）上
+        """
+        try:
+            real_path = os.path.realpath(path)
+            mount_point, fstype = "", ""
+            with open("/proc/mounts", encoding="utf-8") as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 3:
+                        continue
+                    # 挂载点中的空格等字符以八进制转义
+                    point = re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), fields[1])
+                    if (real_path == point or real_path.startswith(point.rstrip("/") + "/")) \
+                            and len(point) >= len(mount_point):
+                        mount_point, fstype = point, fields[2]
+            fstype = fstype.lower()
+            return fstype in self._remote_fuse_types or fstype.startswith(self._remote_fstypes)
+        except Exception as e:
+            logger.debug(f"获取 {path} 文件系统类型失败：{str(e)}")
+            return False
+
     def __update_config(self):
         """
         更新配置
@@ -267,6 +1768,12 @@ class CloudLinkMonitor(_PluginBase):
             "monitor_dirs": self._monitor_dirs,
             "exclude_keywords": self._exclude_keywords,
             "interval": self._interval,
+            "workers": self._workers,
+            "debounce": self._debounce,
+            "incremental": self._incremental,
+            "observer_threads": self._observer_threads,
+            "recognize_rate": self._recognize_rate,
+            "recognize_burst": self._recognize_burst,
             "history": self._history,
             "softlink": self._softlink,
             "cron": self._cron,
@@ -277,403 +1784,774 @@ class CloudLinkMonitor(_PluginBase):
             "refresh": self._refresh,
         })
 
-    @eventmanager.register(EventType.PluginAction)
-    def remote_sync(self, event: Event):
+    @eventmanager.register(EventType.PluginAction)
+    def remote_sync(self, event: Event):
+        """
+        远程全量同步
+        """
+        if event:
+            event_data = event.event_data
+            if not event_data or event_data.get("action") != "cloud_link_sync":
+                return
+            if not self._pool:
+                self.post_message(channel=event.event_data.get("channel"),
+                                  title="云盘实时监控未启用，无法同步",
+                                  userid=event.event_data.get("user"))
+                return
+            self.post_message(channel=event.event_data.get("channel"),
+                              title="开始同步云盘实时监控目录 ...",
+                              userid=event.event_data.get("user"))
+        self.sync_all(full=True)
+        if event:
+            self.post_message(channel=event.event_data.get("channel"),
+                              title="云盘实时监控目录同步完成！", userid=event.event_data.get("user"))
+
+    @eventmanager.register(EventType.TransferComplete)
+    def update_processed(self, event: Event):
+        """
+        其它途径整理完成的文件同步加入已整理索引
+        """
+        if not self._processed or not event or not event.event_data:
+            return
+        transferinfo = event.event_data.get("transferinfo")
+        fileitem = getattr(transferinfo, "fileitem", None)
+        if fileitem and fileitem.path:
+            self._processed.add(fileitem.path)
+
+    def sync_all(self, full: bool = False):
+        """
+        立即运行一次，同步目录中所有文件
+        :param full: 是否全量同步，否则开启增量同步时只处理目录快照之后新增或变化的文件
+        """
+        if not self._pool:
+            logger.warn("云盘实时监控未启用，不同步")
+            return
+        with self.__scanning():
+            self.__sync_all(full)
+
+    def __sync_all(self, full: bool):
+        incremental = self._incremental and not full
+        logger.info(f"开始{'增量' if incremental else '全量'}同步云盘实时监控目录 ...")
+        snapshots = (self.get_data("snapshot") or {}) if self._incremental else {}
+        # 遍历所有监控目录
+        for mon_path in self._routes.paths():
+            logger.info(f"开始处理监控目录 {mon_path} ...")
+            # 未开启增量同步时不记录快照，内存占用与文件数无关
+            # 嵌套的监控目录由其自身的路由处理，不重复遍历
+            walker = SnapshotWalker(extensions=settings.RMT_MEDIAEXT,
+                                    snapshot=snapshots.get(mon_path) if incremental else None,
+                                    workers=self._workers,
+                                    record=self._incremental,
+                                    prune=self._routes.nested(mon_path),
+                                    trust_mtime=not self.__is_remote(mon_path))
+            count, _ = self.__sync_dir(mon_path, walker)
+            # 快照只包含已处理完成的文件，未成功的文件下次重新处理
+            if walker.snapshot is not None:
+                snapshots[mon_path] = walker.snapshot
+            logger.info(f"监控目录 {mon_path} 共处理 {count} 个文件，{walker.skipped} 个目录未变化")
+        # 保存目录快照，移除已不再监控的目录
+        if self._incremental:
+            self.save_data("snapshot", {mon_path: snapshot for mon_path, snapshot in snapshots.items()
+                                        if mon_path in self._routes})
+        logger.info(f"{'增量' if incremental else '全量'}同步云盘实时监控目录完成！")
+
+    def catch_up(self):
+        """
+        启动补偿扫描，只处理上次停止前已处理到的时间之后新增或变化的文件
+        """
+        with self.__scanning():
+            self.__catch_up()
+
+    def __catch_up(self):
+        # 扫描开始后的变化由监控处理，完整扫描的目录只推进到开始时间
+        started_at = time.time()
+        watermarks = self.get_data("watermark") or {}
+        advanced = {}
+        # 上次补偿扫描记录的目录结构，没有时使用增量同步的目录快照
+        trees = self.get_data("tree") or {}
+        snapshots = (self.get_data("snapshot") or {}) if self._incremental else {}
+        for mon_path in self._routes.paths():
+            since = watermarks.get(mon_path)
+            if not since:
+                # 首次监控的目录没有遗漏
+                advanced[mon_path] = started_at
+                continue
+            logger.info(f"开始补偿扫描监控目录 {mon_path}，处理 "
+                        f"{datetime.datetime.fromtimestamp(since).strftime('%Y-%m-%d %H:%M:%S')} 之后的文件 ...")
+            walker = SnapshotWalker(extensions=settings.RMT_MEDIAEXT,
+                                    snapshot=trees.get(mon_path) or snapshots.get(mon_path),
+                                    workers=self._workers,
+                                    since=since - self._catch_up_slack,
+                                    prune=self._routes.nested(mon_path),
+                                    trust_mtime=not self.__is_remote(mon_path))
+            count, complete = self.__sync_dir(mon_path, walker)
+            trees[mon_path] = walker.snapshot
+            if complete:
+                advanced[mon_path] = started_at
+                logger.info(f"监控目录 {mon_path} 补偿扫描完成，共处理 {count} 个文件，{walker.skipped} 个目录无变化")
+            else:
+                # 未完整处理时保留原时间，下次启动重新补偿
+                advanced[mon_path] = since
+                logger.warn(f"监控目录 {mon_path} 补偿扫描未完成，共处理 {count} 个文件，下次启动时重新扫描")
+        if not len(self._routes):
+            # 扫描期间插件已停止，不覆盖已记录的数据
+            return
+        self.save_data("tree", {mon_path: tree for mon_path, tree in trees.items() if mon_path in self._routes})
+        self.save_data("watermark", advanced)
+
+    @contextmanager
+    def __scanning(self):
+        """
+        标记同步或补偿扫描进行中，期间不推进已处理时间
+        """
+        with self._scans_lock:
+            self._scans += 1
+        try:
+            yield
+        finally:
+            with self._scans_lock:
+                self._scans -= 1
+
+    def __sync_dir(self, mon_path: str, walker: SnapshotWalker) -> Tuple[int, bool]:
+        """
+        遍历监控目录，同一目录的文件合并为一批提交线程池并发处理，等待全部完成；
+        被取消、出错或未处理成功的文件从快照中移除，线程池关闭时停止遍历
+        :return: 处理的文件数，是否全部处理成功
+        """
+        # 重载插件时线程池会被替换，遍历期间始终使用开始时的线程池
+        pool = self._pool
+        if not pool:
+            return 0, False
+        lock = threading.Lock()
+        pending = set()
+        failed: Set[str] = set()
+        count = 0
+        batch: List[str] = []
+        aborted = False
+
+        def __done(_future: Future, paths: List[str]):
+            with lock:
+                pending.discard(_future)
+                if _future.cancelled() or _future.exception():
+                    failed.update(paths)
+                else:
+                    failed.update(_future.result() or ())
+
+        def __submit() -> bool:
+            try:
+                future = pool.submit(event_paths=batch, mon_path=mon_path,
+                                     priority=TransferWorkerPool.BACKFILL)
+            except RuntimeError:
+                # 线程池已关闭
+                with lock:
+                    failed.update(batch)
+                return False
+            with lock:
+                pending.add(future)
+            future.add_done_callback(lambda _future, paths=batch: __done(_future, paths))
+            return True
+
+        for file_path in walker.walk(Path(mon_path)):
+            if batch and os.path.dirname(batch[0]) != str(file_path.parent):
+                if not __submit():
+                    aborted = True
+                    break
+                batch = []
+            logger.info(f"开始处理文件 {file_path} ...")
+            count += 1
+            batch.append(str(file_path))
+        else:
+            if batch and not __submit():
+                aborted = True
+        if aborted:
+            logger.warn(f"云盘实时监控已停止，监控目录 {mon_path} 停止遍历")
+        with lock:
+            futures = list(pending)
+        wait(futures)
+        with lock:
+            failed_paths = list(failed)
+        for path in failed_paths:
+            walker.discard(path)
+        if failed_paths:
+            logger.info(f"监控目录 {mon_path} 有 {len(failed_paths)} 个文件未处理成功，下次同步时重新处理")
+        return count, not aborted and not failed_paths and not walker.errors
+
+    def __save_watermark(self, now: Optional[float] = None):
+        """
+        记录各监控目录已处理到的时间，队列中仍有文件或正在同步、补偿扫描时不推进，
+        停止时丢弃的文件由下次启动补偿扫描处理
+        :param now: 监控停止的时间
+        """
+        if self._scans:
+            return
+        if (self._queue and self._queue.size()) or (self._pool and self._pool.active()):
+            return
+        if not len(self._routes):
+            # 路由表已清空时不覆盖已记录的时间
+            return
+        now = now or time.time()
+        self.save_data("watermark", {mon_path: now for mon_path in self._routes.paths()})
+
+    def event_handler(self, event, mon_path: str, text: str, event_path: str):
+        """
+        处理文件变化
+        :param event: 事件
+        :param mon_path: 监控目录
+        :param text: 事件描述
+        :param event_path: 事件文件路径
+        """
+        if not event.is_directory:
+            # 文件发生变化
+            logger.debug("文件%s：%s" % (text, event_path))
+            if self._queue:
+                route = self._routes.resolve(event_path)
+                self._queue.put(path=event_path, mon_path=route.path if route else mon_path)
+
+    def event_touch(self, event, event_path: str):
+        """
+        文件内容变化，推迟已在防抖队列中的文件
+        :param event: 事件
+        :param event_path: 事件文件路径
+        """
+        if not event.is_directory and self._queue:
+            self._queue.touch(event_path)
+
+    @staticmethod
+    def __load_processed() -> Iterable[str]:
+        """
+        读取所有整理历史的源路径，只查询src列
+        """
+        with SessionFactory() as db:
+            for (src,) in db.query(TransferHistory.src).yield_per(10000):
+                yield src
+
+    def __is_processed(self, src: str) -> bool:
+        """
+        判断源路径是否已整理过，索引未命中时不查库
+        """
+        if not self._processed.might_contain(src):
+            return False
+        # 尚未写入数据库的记录
+        if self._history_buffer and self._history_buffer.contains(src):
+            return True
+        # 仅查重串行执行
+        with self._dedupe_lock:
+            transfer_history = self.transferhis.get_by_src(src)
+        if not transfer_history:
+            # 历史记录已被删除，同步索引
+            self._processed.discard(src)
+            return False
+        return True
+
+    def __get_transfer_exclude_matcher(self) -> ExcludeMatcher:
+        """
+        获取整理屏蔽词匹配器，系统设置变化时重新编译
+        """
+        words = self.systemconfig.get(SystemConfigKey.TransferExcludeWords)
+        matcher = self._transfer_exclude_matcher
+        if not matcher or matcher.keywords != tuple(word for word in words or [] if word):
+            matcher = ExcludeMatcher(words, flags=re.IGNORECASE)
+            self._transfer_exclude_matcher = matcher
+        return matcher
+
+    def __recognize_media(self, file_meta: MetaInfoPath, priority: int) -> Optional[MediaInfo]:
+        """
+        识别媒体信息，按名称、年份、类型、季缓存，返回副本避免并发修改
+        """
+        mediainfo = self._recognize_cache.get(
+            self.__media_key(file_meta),
+            lambda: self._recognizer.call(lambda: self.chain.recognize_media(meta=file_meta),
+                                          priority=priority, retry_empty=True))
+        return copy.deepcopy(mediainfo) if mediainfo else None
+
+    def __get_episodes(self, tmdbid: int, season: int, priority: int) -> list:
+        """
+        获取季的集信息
+        """
+        return self._episodes_cache.get(
+            (tmdbid, season),
+            lambda: self._recognizer.call(lambda: self.tmdbchain.tmdb_episodes(tmdbid=tmdbid, season=season),
+                                          priority=priority))
+
+    def __get_history_title(self, mediainfo: MediaInfo) -> Optional[str]:
+        """
+        查询该媒体之前整理时使用的标题
+        """
+
+        def __load():
+            transfer_history = self.transferhis.get_by_type_tmdbid(tmdbid=mediainfo.tmdb_id,
+                                                                   mtype=mediainfo.type.value)
+            return transfer_history.title if transfer_history else None
+
+        return self._title_cache.get((mediainfo.tmdb_id, mediainfo.type.value), __load)
+
+    def cache_stats(self) -> schemas.Response:
+        """
+        API调用查询识别缓存命中情况
+        """
+        return schemas.Response(success=True, data={
+            "recognize": self._recognize_cache.stats() if self._recognize_cache else {},
+            "episodes": self._episodes_cache.stats() if self._episodes_cache else {},
+            "title": self._title_cache.stats() if self._title_cache else {},
+        })
+
+    @staticmethod
+    def __source_key(event_path: str) -> str:
+        """
+        源文件锁的键，蓝光目录以BDMV前面的路径为准，避免多个STREAM文件重复整理
+        """
+        if re.search(r"BDMV[/\\]STREAM", event_path, re.IGNORECASE):
+            return event_path[:event_path.find("BDMV")]
+        return event_path
+
+    @staticmethod
+    def __media_key(file_meta: MetaInfoPath) -> tuple:
+        """
+        同一媒体季的键，用于识别缓存及批量整理分组
+        """
+        return ((file_meta.name or "").strip().lower(), file_meta.year, file_meta.type, file_meta.begin_season,
+                getattr(file_meta, "tmdbid", None), getattr(file_meta, "doubanid", None))
+
+    @staticmethod
+    def __dest_key(mediainfo: MediaInfo, file_meta: MetaInfoPath, target_dir: TransferDirectoryConf) -> tuple:
         """
-        远程全量同步
+        目的文件锁的键：媒体库目录下同一媒体的同一集，电影为同一部，不同集可并发转移
         """
-        if event:
-            event_data = event.event_data
-            if not event_data or event_data.get("action") != "cloud_link_sync":
-                return
-            self.post_message(channel=event.event_data.get("channel"),
-                              title="开始同步云盘实时监控目录 ...",
-                              userid=event.event_data.get("user"))
-        self.sync_all()
-        if event:
-            self.post_message(channel=event.event_data.get("channel"),
-                              title="云盘实时监控目录同步完成！", userid=event.event_data.get("user"))
+        return (str(target_dir.library_path), mediainfo.type.value if mediainfo.type else None,
+                mediainfo.tmdb_id or mediainfo.douban_id or mediainfo.title_year,
+                file_meta.begin_season, file_meta.episode)
 
-    def sync_all(self):
+    def stage_stats(self) -> schemas.Response:
         """
-        立即运行一次，全量同步目录中所有文件
+        API调用查询各阶段耗时统计
         """
-        logger.info("开始全量同步云盘实时监控目录 ...")
-        # 遍历所有监控目录
-        for mon_path in self._dirconf.keys():
-            logger.info(f"开始处理监控目录 {mon_path} ...")
-            list_files = SystemUtils.list_files(Path(mon_path), settings.RMT_MEDIAEXT)
-            logger.info(f"监控目录 {mon_path} 共发现 {len(list_files)} 个文件")
-            # 遍历目录下所有文件
-            for file_path in list_files:
-                logger.info(f"开始处理文件 {file_path} ...")
-                self.__handle_file(event_path=str(file_path), mon_path=mon_path)
-        logger.info("全量同步云盘实时监控目录完成！")
+        return schemas.Response(success=True, data={
+            "stages": self._stats.summary() if self._stats else {},
+            "queues": self.__queue_sizes()
+        })
 
-    def event_handler(self, event, mon_path: str, text: str, event_path: str):
+    def __queue_sizes(self) -> Dict[str, int]:
         """
-        处理文件变化
-        :param event: 事件
-        :param mon_path: 监控目录
-        :param text: 事件描述
-        :param event_path: 事件文件路径
+        各队列当前长度
         """
-        if not event.is_directory:
-            # 文件发生变化
-            logger.debug("文件%s：%s" % (text, event_path))
-            self.__handle_file(event_path=event_path, mon_path=mon_path)
+        return {
+            "debounce": self._queue.size() if self._queue else 0,
+            "history": self._history_buffer.size() if self._history_buffer else 0,
+            "event": self._dispatcher.size() if self._dispatcher else 0,
+            "notify": self._medias.size() if self._medias else 0,
+        }
 
-    def __handle_file(self, event_path: str, mon_path: str):
+    def __handle_files(self, event_paths: List[str], mon_path: str,
+                       priority: int = TransferWorkerPool.REALTIME) -> Set[str]:
         """
-        同步一个文件
-        :param event_path: 事件文件路径
+        同步同一目录下的一批文件，同一媒体季的文件共用一次识别、集信息查询、刮削和下游事件
+        :param event_paths: 事件文件路径
         :param mon_path: 监控目录
+        :param priority: 优先级，实时事件或全量同步
+        :return: 未处理成功、需要重新处理的文件
         """
-        file_path = Path(event_path)
+        failed: Set[str] = set()
         try:
-            if not file_path.exists():
-                return
-            # 全程加锁
-            with lock:
-                transfer_history = self.transferhis.get_by_src(event_path)
-                if transfer_history:
-                    logger.info("文件已处理过：%s" % event_path)
-                    return
-
-                # 回收站及隐藏的文件不处理
-                if event_path.find('/@Recycle/') != -1 \
-                        or event_path.find('/#recycle/') != -1 \
-                        or event_path.find('/.') != -1 \
-                        or event_path.find('/@eaDir') != -1:
-                    logger.debug(f"{event_path} 是回收站或隐藏的文件")
-                    return
-
-                # 命中过滤关键字不处理
-                if self._exclude_keywords:
-                    for keyword in self._exclude_keywords.split("\n"):
-                        if keyword and re.findall(keyword, event_path):
-                            logger.info(f"{event_path} 命中过滤关键字 {keyword}，不处理")
-                            return
-
-                # 整理屏蔽词不处理
-                transfer_exclude_words = self.systemconfig.get(SystemConfigKey.TransferExcludeWords)
-                if transfer_exclude_words:
-                    for keyword in transfer_exclude_words:
-                        if not keyword:
-                            continue
-                        if keyword and re.search(r"%s" % keyword, event_path, re.IGNORECASE):
-                            logger.info(f"{event_path} 命中整理屏蔽词 {keyword}，不处理")
-                            return
-
-                # 不是媒体文件不处理
-                if file_path.suffix not in settings.RMT_MEDIAEXT:
-                    logger.debug(f"{event_path} 不是媒体文件")
-                    return
-
-                # 判断是不是蓝光目录
-                if re.search(r"BDMV[/\\]STREAM", event_path, re.IGNORECASE):
-                    # 截取BDMV前面的路径
-                    blurray_dir = event_path[:event_path.find("BDMV")]
-                    file_path = Path(blurray_dir)
-                    logger.info(f"{event_path} 是蓝光目录，更正文件路径为：{str(file_path)}")
-                    # 查询历史记录，已转移的不处理
-                    if self.transferhis.get_by_src(str(file_path)):
-                        logger.info(f"{file_path} 已整理过")
-                        return
+            event_paths = [event_path for event_path in event_paths if Path(event_path).exists()]
+            if not event_paths:
+                return failed
+            # 同一源文件串行处理，按顺序加锁避免死锁
+            with ExitStack() as stack:
+                with self._stats.timer("lock_wait"):
+                    for key in sorted({self.__source_key(event_path) for event_path in event_paths}):
+                        stack.enter_context(self._source_lock(key))
+                # 预检查，蓝光目录的多个STREAM文件只保留一个
+                tasks: Dict[str, dict] = {}
+                for event_path in event_paths:
+                    try:
+                        task = self.__prepare_file(event_path=event_path, mon_path=mon_path,
+                                                   skip=tasks.keys(), failed=failed)
+                    except Exception as e:
+                        logger.error("目录监控发生错误：%s - %s" % (str(e), traceback.format_exc()))
+                        failed.add(event_path)
+                        continue
+                    if task:
+                        tasks[str(task["file_path"])] = task
+                # 按媒体季分组，各组分给线程池空闲线程并发整理
+                groups: Dict[tuple, List[dict]] = {}
+                for task in tasks.values():
+                    groups.setdefault(self.__media_key(task["file_meta"]), []).append(task)
+
+                def __group(group: List[dict]) -> Set[str]:
+                    try:
+                        return self.__transfer_group(tasks=group, mon_path=mon_path, priority=priority)
+                    except Exception as err:
+                        logger.error("目录监控发生错误：%s - %s" % (str(err), traceback.format_exc()))
+                        return {task["event_path"] for task in group}
 
-                # 元数据
-                file_meta = MetaInfoPath(file_path)
-                if not file_meta.name:
-                    logger.error(f"{file_path.name} 无法识别有效信息")
-                    return
+                for group_failed in self.__map(__group, list(groups.values()), priority=priority):
+                    failed.update(group_failed)
+        except Exception as e:
+            logger.error("目录监控发生错误：%s - %s" % (str(e), traceback.format_exc()))
+            return set(event_paths)
+        return failed
 
-                # 判断文件大小
-                if self._size and float(self._size) > 0 and file_path.stat().st_size < float(self._size) * 1024 ** 3:
-                    logger.info(f"{file_path} 文件大小小于监控文件大小，不处理")
-                    return
+    def __map(self, func: Callable, items: List[Any], priority: int) -> List[Any]:
+        """
+        通过转移线程池并发执行，线程池已停止时依次执行
+        """
+        pool = self._pool
+        if not pool:
+            return [func(item) for item in items]
+        return pool.map(func, items, priority=priority)
 
-                # 查询转移目的目录
-                target: Path = self._dirconf.get(mon_path)
-                # 查询转移方式
-                transfer_type = self._transferconf.get(mon_path)
+    def __prepare_file(self, event_path: str, mon_path: str, skip: Iterable[str] = (),
+                       failed: Optional[Set[str]] = None) -> Optional[dict]:
+        """
+        检查一个文件是否需要整理，由 __handle_files 按源文件加锁后调用
+        :param event_path: 事件文件路径
+        :param mon_path: 监控目录
+        :param skip: 本批次已包含的源路径
+        :param failed: 暂时无法处理、需要重新处理的文件
+        :return: {"event_path": 事件文件路径, "file_path": 源路径, "file_meta": 元数据, "file_item": 文件项}
+        """
+        file_path = Path(event_path)
+        if self.__is_processed(event_path):
+            logger.info("文件已处理过：%s" % event_path)
+            return None
+
+        # 回收站及隐藏的文件不处理
+        if event_path.find('/@Recycle/') != -1 \
+                or event_path.find('/#recycle/') != -1 \
+                or event_path.find('/.') != -1 \
+                or event_path.find('/@eaDir') != -1:
+            logger.debug(f"{event_path} 是回收站或隐藏的文件")
+            return None
+
+        # 命中过滤关键字不处理
+        keyword = self._exclude_matcher.match(event_path)
+        if keyword:
+            logger.info(f"{event_path} 命中过滤关键字 {keyword}，不处理")
+            return None
+
+        # 整理屏蔽词不处理
+        keyword = self.__get_transfer_exclude_matcher().match(event_path)
+        if keyword:
+            logger.info(f"{event_path} 命中整理屏蔽词 {keyword}，不处理")
+            return None
+
+        # 不是媒体文件不处理
+        if file_path.suffix not in settings.RMT_MEDIAEXT:
+            logger.debug(f"{event_path} 不是媒体文件")
+            return None
+
+        # 判断是不是蓝光目录
+        if re.search(r"BDMV[/\\]STREAM", event_path, re.IGNORECASE):
+            # 截取BDMV前面的路径
+            blurray_dir = event_path[:event_path.find("BDMV")]
+            file_path = Path(blurray_dir)
+            if str(file_path) in skip:
+                return None
+            logger.info(f"{event_path} 是蓝光目录，更正文件路径为：{str(file_path)}")
+            # 查询历史记录，已转移的不处理
+            if self.__is_processed(str(file_path)):
+                logger.info(f"{file_path} 已整理过")
+                return None
+
+        # 元数据
+        file_meta = MetaInfoPath(file_path)
+        if not file_meta.name:
+            logger.error(f"{file_path.name} 无法识别有效信息")
+            return None
+
+        # 判断文件大小
+        route = self._routes.get(mon_path)
+        if route and route.size > 0 and file_path.stat().st_size < route.size * 1024 ** 3:
+            logger.info(f"{file_path} 文件大小小于监控文件大小，不处理")
+            return None
+
+        # 查找这个文件项
+        with self._stats.timer("get_file_item") as stage:
+            file_item = self.storagechain.get_file_item(storage="local", path=file_path)
+            stage["error"] = not file_item
+        if not file_item:
+            logger.warn(f"{file_path.name} 未找到对应的文件")
+            if failed is not None:
+                failed.add(event_path)
+            return None
+        return {
+            "event_path": event_path,
+            "file_path": file_path,
+            "file_meta": file_meta,
+            "file_item": file_item
+        }
 
-                # 查找这个文件项
-                file_item = self.storagechain.get_file_item(storage="local", path=file_path)
-                if not file_item:
-                    logger.warn(f"{event_path.name} 未找到对应的文件")
-                    return
-                # 识别媒体信息
-                mediainfo: MediaInfo = self.chain.recognize_media(meta=file_meta)
-                if not mediainfo:
-                    logger.warn(f'未识别到媒体信息，标题：{file_meta.name}')
-                    # 新增转移成功历史记录
-                    his = self.transferhis.add_fail(
-                        fileitem=file_item,
-                        mode=transfer_type,
-                        meta=file_meta
+    def __transfer_group(self, tasks: List[dict], mon_path: str, priority: int) -> Set[str]:
+        """
+        整理同一媒体季的一组文件
+        :param tasks: __prepare_file 的检查结果
+        :param mon_path: 监控目录
+        :param priority: 识别请求优先级
+        :return: 未处理成功且未记录整理历史的文件
+        """
+        # 查询转移目的目录及转移方式
+        route = self._routes.get(mon_path)
+        if not route:
+            logger.error(f"监控目录 {mon_path} 已不在监控配置中")
+            return {task["event_path"] for task in tasks}
+        transfer_type = route.transfer_type
+
+        # 识别媒体信息，同组共用一次识别
+        file_meta = tasks[0]["file_meta"]
+        with self._stats.timer("recognize_media") as stage:
+            mediainfo = self.__recognize_media(file_meta, priority=priority)
+            stage["error"] = not mediainfo
+        if not mediainfo:
+            logger.warn(f'未识别到媒体信息，标题：{file_meta.name}')
+            for task in tasks:
+                # 新增转移失败历史记录
+                his = self.transferhis.add_fail(
+                    fileitem=task["file_item"],
+                    mode=transfer_type,
+                    meta=task["file_meta"]
+                )
+                self._processed.add(str(task["file_path"]))
+                if self._notify:
+                    self.post_message(
+                        mtype=NotificationType.Manual,
+                        title=f"{task['file_path'].name} 未识别到媒体信息，无法入库！\n"
+                              f"回复：```\n/redo {his.id} [tmdbid]|[类型]\n``` 手动识别转移。"
                     )
-                    if self._notify:
-                        self.post_message(
-                            mtype=NotificationType.Manual,
-                            title=f"{file_path.name} 未识别到媒体信息，无法入库！\n"
-                                  f"回复：```\n/redo {his.id} [tmdbid]|[类型]\n``` 手动识别转移。"
-                        )
-                    return
+            return set()
+
+        # 如果未开启新增已入库媒体是否跟随TMDB信息变化则根据tmdbid查询之前的title
+        if not settings.SCRAP_FOLLOW_TMDB:
+            title = self.__get_history_title(mediainfo)
+            if title:
+                mediainfo.title = title
+        if len(tasks) > 1:
+            logger.info(f"{tasks[0]['file_path'].name} 等 {len(tasks)} 个文件识别为：{mediainfo.type.value} {mediainfo.title_year}")
+        else:
+            logger.info(f"{tasks[0]['file_path'].name} 识别为：{mediainfo.type.value} {mediainfo.title_year}")
+
+        # 获取集数据
+        if mediainfo.type == MediaType.TV:
+            with self._stats.timer("tmdb_episodes"):
+                episodes_info = self.__get_episodes(tmdbid=mediainfo.tmdb_id,
+                                                    season=1 if file_meta.begin_season is None else file_meta.begin_season,
+                                                    priority=priority)
+        else:
+            episodes_info = None
+
+        # 查询转移目的目录
+        with self._stats.timer("get_dir"):
+            target_dir = DirectoryHelper().get_dir(mediainfo, src_path=Path(mon_path))
+        if not target_dir or not target_dir.library_path or not target_dir.download_path.startswith(mon_path):
+            target_dir = TransferDirectoryConf()
+            target_dir.library_path = route.target
+            target_dir.transfer_type = transfer_type
+            target_dir.scraping = self._scrape
+            target_dir.renaming = True
+            target_dir.notify = False
+            target_dir.overwrite_mode = route.overwrite_mode or 'never'
+            target_dir.library_storage = "local"
+            target_dir.library_category_folder = self._category
+        else:
+            target_dir.transfer_type = transfer_type
+            target_dir.scraping = self._scrape
+
+        if not target_dir.library_path:
+            logger.error(f"未配置监控目录 {mon_path} 的目的目录")
+            return {task["event_path"] for task in tasks}
+
+        # 转移文件，同组文件分给线程池空闲线程并发转移，并发数不超过转移线程数
+        results = self.__map(lambda task: self.__transfer_file(task=task, mediainfo=mediainfo,
+                                                               target_dir=target_dir, episodes_info=episodes_info),
+                             tasks, priority=priority)
+
+        # 历史记录交给写缓冲批量写入，未记录历史的失败文件需要重新处理
+        done: List[Tuple[dict, TransferInfo]] = []
+        failed: Set[str] = set()
+        for task, transferinfo in zip(tasks, results):
+            if not transferinfo:
+                failed.add(task["event_path"])
+                continue
+            if transferinfo.success:
+                done.append((task, transferinfo))
+            if not self._history:
+                if not transferinfo.success:
+                    failed.add(task["event_path"])
+                continue
+            # 新增转移成功/失败历史记录
+            self._history_buffer.add(
+                success=transferinfo.success,
+                fileitem=task["file_item"],
+                mode=transfer_type,
+                meta=task["file_meta"],
+                mediainfo=mediainfo,
+                transferinfo=transferinfo
+            )
+            self._processed.add(str(task["file_path"]))
+        if not done:
+            return failed
+
+        # 刮削，同一目的目录只刮削一次，并串行避免并发写入相同的元数据文件
+        if self._scrape:
+            scraped = set()
+            for task, transferinfo in done:
+                diritem = transferinfo.target_diritem
+                if not diritem or diritem.path in scraped:
+                    continue
+                scraped.add(diritem.path)
+                with self._dest_lock(diritem.path), self._stats.timer("scrape_metadata"):
+                    self.mediaChain.scrape_metadata(fileitem=diritem,
+                                                    meta=task["file_meta"],
+                                                    mediainfo=mediainfo)
 
-                # 如果未开启新增已入库媒体是否跟随TMDB信息变化则根据tmdbid查询之前的title
-                if not settings.SCRAP_FOLLOW_TMDB:
-                    transfer_history = self.transferhis.get_by_type_tmdbid(tmdbid=mediainfo.tmdb_id,
-                                                                           mtype=mediainfo.type.value)
-                    if transfer_history:
-                        mediainfo.title = transfer_history.title
-                logger.info(f"{file_path.name} 识别为：{mediainfo.type.value} {mediainfo.title_year}")
-
-                # 获取集数据
-                if mediainfo.type == MediaType.TV:
-                    episodes_info = self.tmdbchain.tmdb_episodes(tmdbid=mediainfo.tmdb_id,
-                                                                 season=1 if file_meta.begin_season is None else file_meta.begin_season)
-                else:
-                    episodes_info = None
-
-                # 查询转移目的目录
-                target_dir = DirectoryHelper().get_dir(mediainfo, src_path=Path(mon_path))
-                if not target_dir or not target_dir.library_path or not target_dir.download_path.startswith(mon_path):
-                    target_dir = TransferDirectoryConf()
-                    target_dir.library_path = target
-                    target_dir.transfer_type = transfer_type
-                    target_dir.scraping = self._scrape
-                    target_dir.renaming = True
-                    target_dir.notify = False
-                    target_dir.overwrite_mode = self._overwrite_mode.get(mon_path) or 'never'
-                    target_dir.library_storage = "local"
-                    target_dir.library_category_folder = self._category
-                else:
-                    target_dir.transfer_type = transfer_type
-                    target_dir.scraping = self._scrape
+        # 消息汇总
+        if self._notify:
+            for task, transferinfo in done:
+                self.__append_media(file_path=task["file_path"], file_meta=task["file_meta"],
+                                    mediainfo=mediainfo, transferinfo=transferinfo)
 
-                if not target_dir.library_path:
-                    logger.error(f"未配置监控目录 {mon_path} 的目的目录")
-                    return
+        # 下游事件
+        self.__send_events(done=done, mediainfo=mediainfo)
 
-                # 转移文件
-                transferinfo: TransferInfo = self.chain.transfer(fileitem=file_item,
-                                                                 meta=file_meta,
-                                                                 mediainfo=mediainfo,
-                                                                 target_directory=target_dir,
-                                                                 episodes_info=episodes_info)
+        # 移动模式删除空目录，等待静默后统一清理
+        if transfer_type == "move":
+            self._cleaner.add(file_paths=[task["file_path"] for task, _ in done], mon_path=mon_path)
+        return failed
 
-                if not transferinfo:
-                    logger.error("文件转移模块运行失败")
-                    return
+    def __transfer_file(self, task: dict, mediainfo: MediaInfo, target_dir: TransferDirectoryConf,
+                        episodes_info: Optional[list]) -> Optional[TransferInfo]:
+        """
+        转移一个文件
+        :return: 转移结果，转移模块运行失败时返回None
+        """
+        file_path: Path = task["file_path"]
+        file_meta: MetaInfoPath = task["file_meta"]
+        # 同一目的文件串行转移，避免不同来源的同一集同时通过覆盖检查
+        with self._dest_lock(self.__dest_key(mediainfo, file_meta, target_dir)), \
+                self._stats.timer("transfer") as stage:
+            transferinfo: TransferInfo = self.chain.transfer(fileitem=task["file_item"],
+                                                             meta=file_meta,
+                                                             mediainfo=mediainfo,
+                                                             target_directory=target_dir,
+                                                             episodes_info=episodes_info)
+            stage["error"] = not transferinfo or not transferinfo.success
 
-                if not transferinfo.success:
-                    # 转移失败
-                    logger.warn(f"{file_path.name} 入库失败：{transferinfo.message}")
-
-                    if self._history:
-                        # 新增转移失败历史记录
-                        self.transferhis.add_fail(
-                            fileitem=file_item,
-                            mode=transfer_type,
-                            meta=file_meta,
-                            mediainfo=mediainfo,
-                            transferinfo=transferinfo
-                        )
-                    if self._notify:
-                        self.post_message(
-                            mtype=NotificationType.Manual,
-                            title=f"{mediainfo.title_year}{file_meta.season_episode} 入库失败！",
-                            text=f"原因：{transferinfo.message or '未知'}",
-                            image=mediainfo.get_message_image()
-                        )
-                    return
+        if not transferinfo:
+            logger.error("文件转移模块运行失败")
+            return None
 
-                if self._history:
-                    # 新增转移成功历史记录
-                    self.transferhis.add_success(
-                        fileitem=file_item,
-                        mode=transfer_type,
-                        meta=file_meta,
-                        mediainfo=mediainfo,
-                        transferinfo=transferinfo
-                    )
+        if not transferinfo.success:
+            # 转移失败
+            logger.warn(f"{file_path.name} 入库失败：{transferinfo.message}")
+            if self._notify:
+                self.post_message(
+                    mtype=NotificationType.Manual,
+                    title=f"{mediainfo.title_year}{file_meta.season_episode} 入库失败！",
+                    text=f"原因：{transferinfo.message or '未知'}",
+                    image=mediainfo.get_message_image()
+                )
+        return transferinfo
+
+    def __append_media(self, file_path: Path, file_meta: MetaInfoPath,
+                       mediainfo: MediaInfo, transferinfo: TransferInfo):
+        """
+        加入入库消息汇总，汇总文件数超过上限时提前发送
+        """
+        self._medias.put(key=mediainfo.title_year + " " + file_meta.season,
+                         path=str(file_path),
+                         size=transferinfo.total_size,
+                         episode=file_meta.begin_episode,
+                         mediainfo=mediainfo,
+                         file_meta=file_meta,
+                         transferinfo=transferinfo)
+        if self._medias.full():
+            self.send_msg()
+
+    def __send_events(self, done: List[Tuple[dict, TransferInfo]], mediainfo: MediaInfo):
+        """
+        发送下游事件，同一批文件合并为一个CMS通知与整理完成事件
+        """
+        transferinfo = done[0][1]
+        if len(done) > 1:
+            # 合并同一批次的转移结果
+            transferinfo = copy.copy(done[-1][1])
+            transferinfo.file_list = [file for _, info in done for file in info.file_list or []]
+            transferinfo.file_list_new = [file for _, info in done for file in info.file_list_new or []]
+            transferinfo.total_size = sum(info.total_size or 0 for _, info in done)
+            transferinfo.file_count = len(done)
+
+        # 发送CMS通知事件
+        self._dispatcher.put(EventType.PluginAction, {
+            'file_path': str(done[0][1].target_item.path),
+            'file_paths': [str(info.target_item.path) for _, info in done],
+            'action': 'cms_notify',
+            'media_type': mediainfo.type.value,
+            'title': mediainfo.title,
+            'year': mediainfo.year,
+            'source': 'cloudlinkmonitor'
+        })
 
-                # 刮削
-                if self._scrape:
-                    self.mediaChain.scrape_metadata(fileitem=transferinfo.target_diritem,
-                                                    meta=file_meta,
-                                                    mediainfo=mediainfo)
-                                                                                                      
-                # ========== 新增：发送CMS通知事件 ==========
-                self.eventmanager.send_event(EventType.PluginAction, {
-                    'file_path': str(transferinfo.target_item.path),
-                    'action': 'cms_notify',
-                    'media_type': mediainfo.type.value,
-                    'title': mediainfo.title,
-                    'year': mediainfo.year,
-                    'source': 'cloudlinkmonitor'
+        if self._refresh:
+            # 广播事件
+            self._dispatcher.put(EventType.TransferComplete, {
+                'meta': done[0][0]["file_meta"],
+                'mediainfo': mediainfo,
+                'transferinfo': transferinfo
+            })
+
+        for _, info in done:
+            if self._softlink:
+                # 通知实时软连接生成
+                self._dispatcher.put(EventType.PluginAction, {
+                    'file_path': str(info.target_item.path),
+                    'action': 'softlink_file'
                 })
-                # ========== 新增代码结束 ==========
-
-                """
-                {
-                    "title_year season": {
-                        "files": [
-                            {
-                                "path":,
-                                "mediainfo":,
-                                "file_meta":,
-                                "transferinfo":
-                            }
-                        ],
-                        "time": "2023-08-24 23:23:23.332"
-                    }
-                }
-                """
-                if self._notify:
-                    # 发送消息汇总
-                    media_list = self._medias.get(mediainfo.title_year + " " + file_meta.season) or {}
-                    if media_list:
-                        media_files = media_list.get("files") or []
-                        if media_files:
-                            file_exists = False
-                            for file in media_files:
-                                if str(file_path) == file.get("path"):
-                                    file_exists = True
-                                    break
-                            if not file_exists:
-                                media_files.append({
-                                    "path": str(file_path),
-                                    "mediainfo": mediainfo,
-                                    "file_meta": file_meta,
-                                    "transferinfo": transferinfo
-                                })
-                        else:
-                            media_files = [
-                                {
-                                    "path": str(file_path),
-                                    "mediainfo": mediainfo,
-                                    "file_meta": file_meta,
-                                    "transferinfo": transferinfo
-                                }
-                            ]
-                        media_list = {
-                            "files": media_files,
-                            "time": datetime.datetime.now()
-                        }
-                    else:
-                        media_list = {
-                            "files": [
-                                {
-                                    "path": str(file_path),
-                                    "mediainfo": mediainfo,
-                                    "file_meta": file_meta,
-                                    "transferinfo": transferinfo
-                                }
-                            ],
-                            "time": datetime.datetime.now()
-                        }
-                    self._medias[mediainfo.title_year + " " + file_meta.season] = media_list
-
-                if self._refresh:
-                    # 广播事件
-                    self.eventmanager.send_event(EventType.TransferComplete, {
-                        'meta': file_meta,
-                        'mediainfo': mediainfo,
-                        'transferinfo': transferinfo
-                    })
-
-                if self._softlink:
-                    # 通知实时软连接生成
-                    self.eventmanager.send_event(EventType.PluginAction, {
-                        'file_path': str(transferinfo.target_item.path),
-                        'action': 'softlink_file'
-                    })
-
-                if self._strm:
-                    # 通知Strm助手生成
-                    self.eventmanager.send_event(EventType.PluginAction, {
-                        'file_path': str(transferinfo.target_item.path),
-                        'action': 'cloudstrm_file'
-                    })
-
-                # 移动模式删除空目录
-                if transfer_type == "move":
-                    for file_dir in file_path.parents:
-                        if len(str(file_dir)) <= len(str(Path(mon_path))):
-                            # 重要，删除到监控目录为止
-                            break
-                        files = SystemUtils.list_files(file_dir, settings.RMT_MEDIAEXT + settings.DOWNLOAD_TMPEXT)
-                        if not files:
-                            logger.warn(f"移动模式，删除空目录：{file_dir}")
-                            shutil.rmtree(file_dir, ignore_errors=True)
 
-        except Exception as e:
-            logger.error("目录监控发生错误：%s - %s" % (str(e), traceback.format_exc()))
+            if self._strm:
+                # 通知Strm助手生成
+                self._dispatcher.put(EventType.PluginAction, {
+                    'file_path': str(info.target_item.path),
+                    'action': 'cloudstrm_file'
+                })
 
-    def send_msg(self):
+    def send_msg(self, force: bool = False):
         """
         定时检查是否有媒体处理完，发送统一消息
+        :param force: 不等待到期，全部发送
         """
-        if not self._medias or not self._medias.keys():
+        if not self._medias:
             return
-
-        # 遍历检查是否已刮削完，发送消息
-        for medis_title_year_season in list(self._medias.keys()):
-            media_list = self._medias.get(medis_title_year_season)
-            logger.info(f"开始处理媒体 {medis_title_year_season} 消息")
-
-            if not media_list:
-                continue
-
-            # 获取最后更新时间
-            last_update_time = media_list.get("time")
-            media_files = media_list.get("files")
-            if not last_update_time or not media_files:
-                continue
-
-            transferinfo = media_files[0].get("transferinfo")
-            file_meta = media_files[0].get("file_meta")
-            mediainfo = media_files[0].get("mediainfo")
-            # 判断剧集最后更新时间距现在是已超过10秒或者电影，发送消息
-            if (datetime.datetime.now() - last_update_time).total_seconds() > int(self._interval) \
-                    or mediainfo.type == MediaType.MOVIE:
-                # 发送通知
-                if self._notify:
-
-                    # 汇总处理文件总大小
-                    total_size = 0
-                    file_count = 0
-
-                    # 剧集汇总
-                    episodes = []
-                    for file in media_files:
-                        transferinfo = file.get("transferinfo")
-                        total_size += transferinfo.total_size
-                        file_count += 1
-
-                        file_meta = file.get("file_meta")
-                        if file_meta and file_meta.begin_episode:
-                            episodes.append(file_meta.begin_episode)
-
-                    transferinfo.total_size = total_size
-                    # 汇总处理文件数量
-                    transferinfo.file_count = file_count
-
-                    # 剧集季集信息 S01 E01-E04 || S01 E01、E02、E04
-                    season_episode = None
-                    # 处理文件多，说明是剧集，显示季入库消息
-                    if mediainfo.type == MediaType.TV:
-                        # 季集文本
-                        season_episode = f"{file_meta.season} {StringUtils.format_ep(episodes)}"
-                    # 发送消息
-                    self.transferchian.send_transfer_message(meta=file_meta,
-                                                             mediainfo=mediainfo,
-                                                             transferinfo=transferinfo,
-                                                             season_episode=season_episode)
-                # 发送完消息，移出key
-                del self._medias[medis_title_year_season]
+        # 已有线程在取出汇总时跳过，停止时等待其完成后取出剩余
+        if not self._medias_lock.acquire(blocking=force):
+            return
+        try:
+            items = self._medias.pop_due(force=force)
+        finally:
+            self._medias_lock.release()
+
+        for item in items:
+            mediainfo = item.get("mediainfo")
+            file_meta = item.get("file_meta")
+            media_files = item.get("files")
+            logger.info(f"开始处理媒体 {mediainfo.title_year} {file_meta.season} 消息")
+            if not self._notify:
                 continue
+            # 汇总处理文件总大小和数量
+            transferinfo = copy.copy(item.get("transferinfo"))
+            transferinfo.total_size = sum(size or 0 for size, _ in media_files.values())
+            transferinfo.file_count = len(media_files)
+
+            # 剧集季集信息 S01 E01-E04 || S01 E01、E02、E04
+            season_episode = None
+            # 处理文件多，说明是剧集，显示季入库消息
+            if mediainfo.type == MediaType.TV:
+                # 季集文本
+                episodes = [episode for _, episode in media_files.values() if episode]
+                season_episode = f"{file_meta.season} {StringUtils.format_ep(episodes)}"
+            # 发送消息
+            self.transferchian.send_transfer_message(meta=file_meta,
+                                                     mediainfo=mediainfo,
+                                                     transferinfo=transferinfo,
+                                                     season_episode=season_episode)
 
     def get_state(self) -> bool:
         return self._enabled
@@ -701,6 +2579,18 @@ class CloudLinkMonitor(_PluginBase):
             "methods": ["GET"],
             "summary": "云盘实时监控同步",
             "description": "云盘实时监控同步",
+        }, {
+            "path": "/cache_stats",
+            "endpoint": self.cache_stats,
+            "methods": ["GET"],
+            "summary": "识别缓存统计",
+            "description": "查询识别结果、集信息、历史标题缓存的命中与未命中次数",
+        }, {
+            "path": "/stage_stats",
+            "endpoint": self.stage_stats,
+            "methods": ["GET"],
+            "summary": "处理阶段耗时统计",
+            "description": "查询各处理阶段的次数、失败次数及耗时分位数（毫秒）",
         }]
 
     def get_service(self) -> List[Dict[str, Any]]:
@@ -728,7 +2618,9 @@ class CloudLinkMonitor(_PluginBase):
         """
         API调用目录同步
         """
-        self.sync_all()
+        if not self._pool:
+            return schemas.Response(success=False, message="云盘实时监控未启用")
+        self.sync_all(full=True)
         return schemas.Response(success=True)
 
     def get_form(self) -> Tuple[List[dict], Dict[str, Any]]:
@@ -905,6 +2797,83 @@ class CloudLinkMonitor(_PluginBase):
                             }
                         ]
                     },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'incremental',
+                                            'label': '定时增量同步',
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'observer_threads',
+                                            'label': '监控线程数',
+                                            'placeholder': '4'
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'recognize_rate',
+                                            'label': '识别请求每秒次数',
+                                            'placeholder': '4'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'recognize_burst',
+                                            'label': '识别请求突发次数',
+                                            'placeholder': '8'
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
                     {
                         'component': 'VRow',
                         'content': [
@@ -922,7 +2891,8 @@ class CloudLinkMonitor(_PluginBase):
                                             'label': '监控模式',
                                             'items': [
                                                 {'title': '兼容模式', 'value': 'compatibility'},
-                                                {'title': '性能模式', 'value': 'fast'}
+                                                {'title': '性能模式', 'value': 'fast'},
+                                                {'title': '智能模式', 'value': 'auto'}
                                             ]
                                         }
                                     }
@@ -990,6 +2960,40 @@ class CloudLinkMonitor(_PluginBase):
                                         }
                                     }
                                 ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'workers',
+                                            'label': '并发转移数',
+                                            'placeholder': '4'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'debounce',
+                                            'label': '事件防抖时间',
+                                            'placeholder': '3'
+                                        }
+                                    }
+                                ]
                             }
                         ]
                     },
@@ -1054,6 +3058,7 @@ class CloudLinkMonitor(_PluginBase):
                                             'type': 'info',
                                             'variant': 'tonal',
                                             'text': '入库消息延迟默认10s，如网络较慢可酌情调大，有助于发送统一入库消息。'
+                                                    '智能模式下本地目录使用系统通知，网络挂载目录（rclone/SMB/NFS等）使用自适应轮询。'
                                         }
                                     }
                                 ]
@@ -1101,6 +3106,27 @@ class CloudLinkMonitor(_PluginBase):
                                 ]
                             }
                         ]
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VAlert',
+                                        'props': {
+                                            'type': 'info',
+                                            'variant': 'tonal',
+                                            'text': '开启定时增量同步后，定时任务根据上次同步保存的目录快照只处理新增或变化的文件；立即运行一次与远程同步命令始终全量同步。'
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
                     }
                 ]
             }
@@ -1114,30 +3140,144 @@ class CloudLinkMonitor(_PluginBase):
             "refresh": True,
             "softlink": False,
             "strm": False,
+            "incremental": False,
+            "observer_threads": 4,
+            "recognize_rate": 4,
+            "recognize_burst": 8,
             "mode": "fast",
             "transfer_type": "filesoftlink",
             "monitor_dirs": "",
             "exclude_keywords": "",
             "interval": 10,
+            "workers": 4,
+            "debounce": 3,
             "cron": "",
             "size": 0
         }
 
     def get_page(self) -> List[dict]:
-        pass
+        """
+        各阶段耗时及识别缓存统计
+        """
+        summary = self._stats.summary() if self._stats else {}
+        if not summary:
+            return [
+                {
+                    'component': 'div',
+                    'text': '暂无数据',
+                    'props': {
+                        'class': 'text-center',
+                    }
+                }
+            ]
+        stage_rows = [
+            [self._stage_names.get(stage, stage), item.get("count"), item.get("errors"),
+             item.get("avg"), item.get("p50"), item.get("p95"), item.get("p99")]
+            for stage, item in sorted(summary.items(),
+                                      key=lambda x: list(self._stage_names).index(x[0])
+                                      if x[0] in self._stage_names else len(self._stage_names))
+        ]
+        queue_names = {"debounce": "防抖队列", "history": "历史写缓冲", "event": "事件队列", "notify": "待发送入库消息"}
+        queue_rows = [[queue_names.get(name, name), size] for name, size in self.__queue_sizes().items()]
+        cache_rows = [
+            [name, cache.stats().get("hits"), cache.stats().get("misses"), cache.stats().get("size")]
+            for name, cache in (("识别媒体信息", self._recognize_cache),
+                                ("集信息", self._episodes_cache),
+                                ("历史标题", self._title_cache)) if cache
+        ]
+        return [
+            self.__page_table(headers=["阶段", "次数", "失败", "平均(ms)", "P50(ms)", "P95(ms)", "P99(ms)"],
+                              rows=stage_rows),
+            self.__page_table(headers=["队列", "长度"],
+                              rows=queue_rows),
+            self.__page_table(headers=["缓存", "命中", "未命中", "条目数"],
+                              rows=cache_rows)
+        ]
+
+    @staticmethod
+    def __page_table(headers: List[str], rows: List[list]) -> dict:
+        """
+        数据页表格
+        """
+        return {
+            'component': 'VRow',
+            'content': [
+                {
+                    'component': 'VCol',
+                    'props': {
+                        'cols': 12,
+                    },
+                    'content': [
+                        {
+                            'component': 'VTable',
+                            'props': {
+                                'hover': True
+                            },
+                            'content': [
+                                {
+                                    'component': 'thead',
+                                    'content': [
+                                        {
+                                            'component': 'tr',
+                                            'content': [
+                                                {
+                                                    'component': 'th',
+                                                    'props': {
+                                                        'class': 'text-start ps-4'
+                                                    },
+                                                    'text': header
+                                                } for header in headers
+                                            ]
+                                        }
+                                    ]
+                                },
+                                {
+                                    'component': 'tbody',
+                                    'content': [
+                                        {
+                                            'component': 'tr',
+                                            'content': [
+                                                {
+                                                    'component': 'td',
+                                                    'text': value
+                                                } for value in row
+                                            ]
+                                        } for row in rows
+                                    ]
+                                }
+                            ]
+                        }
+                    ]
+                }
+            ]
+        }
 
     def stop_service(self):
         """
         退出插件
         """
         if self._observer:
-            for observer in self._observer:
-                try:
-                    observer.stop()
-                    observer.join()
-                except Exception as e:
-                    print(str(e))
-        self._observer = []
+            stopped_at = time.time()
+            self._observer.stop()
+            self._observer = None
+            # 停止前无待处理文件时记录停止时间
+            self.__save_watermark(now=stopped_at)
+        if self._queue:
+            self._queue.stop()
+            self._queue = None
+        if self._pool:
+            self._pool.shutdown()
+            self._pool = None
+        if self._medias:
+            # 发送已汇总的入库消息
+            self.send_msg(force=True)
+        if self._history_buffer:
+            # 停止后仍在运行的转移任务会直接写入
+            self._history_buffer.stop()
+        if self._dispatcher:
+            self._dispatcher.stop()
+        if self._cleaner:
+            self._cleaner.stop()
         if self._scheduler:
             self._scheduler.remove_all_jobs()
             if self._scheduler.running:
@@ -0,0 +1,461 @@
+"""
+云盘实时监控性能测试
+
+在临时目录生成模拟的监控目录树，使用注入延迟的桩实现替代媒体识别、转移、刮削与整理历史，
+运行一次全量同步，输出每秒处理文件数、各阶段耗时与内存峰值。不访问网络，也不改动真实媒体库。
+
+默认不限制识别请求频率，测量的是处理流程本身；指定 --recognize-rate 4 --recognize-burst 8 可按插件默认限速测试。
+
+需要在MoviePilot后端环境中运行：
+    cd /path/to/MoviePilot
+    PYTHONPATH=. python /path/to/plugins.v2/cloudlinkmonitor/benchmark.py --files 2000 --workers 8
+"""
+import argparse
+import importlib.util
+import json
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.core.context import MediaInfo
+from app.schemas import FileItem, TransferInfo, TmdbEpisode
+from app.schemas.types import MediaType
+
+# 模拟发布名称
+SHOW_NAMES = ["The.Last.Frontier", "Silent.River", "Northern.Lights", "City.of.Glass", "Broken.Compass",
+              "Midnight.Harbor", "Iron.Valley", "The.Quiet.Shore", "Paper.Kingdom", "Falling.Stars"]
+MOVIE_NAMES = ["Crimson.Tide.Rising", "The.Long.Goodbye", "Echoes.of.Tomorrow", "Desert.Bloom",
+               "Glass.Houses", "The.Ninth.Gate.Keeper", "Winter.Orchard", "Hollow.Crown"]
+RELEASES = ["1080p.WEB-DL.H264.AAC-GRP", "2160p.WEB-DL.H265.DDP5.1-GRP", "1080p.BluRay.x264.DTS-GRP",
+            "720p.HDTV.x264-GRP"]
+
+
+def load_plugin_module():
+    """
+    按文件路径加载插件模块
+    """
+    spec = importlib.util.spec_from_file_location("cloudlinkmonitor_benchmark",
+                                                  Path(__file__).with_name("__init__.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def build_tree(root: Path, files: int, movie_ratio: float, file_size: int, seed: int) -> int:
+    """
+    生成模拟的监控目录：剧集按 剧名 (年份)/Season xx/ 组织，电影每部一个目录，文件为稀疏文件
+    :return: 生成的文件数
+    """
+    rnd = random.Random(seed)
+    count = 0
+    while count < files:
+        if rnd.random() < movie_ratio:
+            name = f"{rnd.choice(MOVIE_NAMES)}.{rnd.randint(1990, 2024)}.{rnd.choice(RELEASES)}"
+            # 同名电影追加序号
+            folder = root / f"{name}.{count}"
+            folder.mkdir(parents=True, exist_ok=True)
+            paths = [folder / f"{name}.mkv"]
+        else:
+            show = rnd.choice(SHOW_NAMES)
+            year = 2000 + SHOW_NAMES.index(show)
+            season = rnd.randint(1, 3)
+            release = rnd.choice(RELEASES)
+            folder = root / f"{show.replace('.', ' ')} ({year})" / f"Season {season:02d}"
+            folder.mkdir(parents=True, exist_ok=True)
+            # 一次生成一季中连续的若干集
+            start = rnd.randint(1, 20)
+            paths = [folder / f"{show}.S{season:02d}E{episode:02d}.{release}.mkv"
+                     for episode in range(start, start + min(rnd.randint(1, 12), files - count))]
+        for path in paths:
+            if path.exists():
+                continue
+            with open(path, "wb") as f:
+                f.truncate(file_size)
+            count += 1
+    return count
+
+
+class Latency:
+    """
+    各桩实现注入的延迟（秒）
+    """
+
+    def __init__(self, recognize: float, episodes: float, transfer: float, scrape: float, db: float):
+        self.recognize = recognize
+        self.episodes = episodes
+        self.transfer = transfer
+        self.scrape = scrape
+        self.db = db
+
+
+class Counter:
+    """
+    线程安全计数
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.values: Dict[str, int] = {}
+
+    def incr(self, name: str):
+        with self._lock:
+            self.values[name] = self.values.get(name, 0) + 1
+
+
+class StubChain:
+    """
+    替代插件的 self.chain，识别按名称与年份生成媒体信息，转移只生成结果不改动文件
+    """
+
+    def __init__(self, latency: Latency, counter: Counter, target: Path):
+        self._latency = latency
+        self._counter = counter
+        self._target = target
+
+    def recognize_media(self, meta, **kwargs) -> Optional[MediaInfo]:
+        time.sleep(self._latency.recognize)
+        self._counter.incr("recognize_media")
+        mediainfo = MediaInfo()
+        mediainfo.type = MediaType.TV if meta.begin_episode else MediaType.MOVIE
+        mediainfo.title = meta.name
+        mediainfo.year = meta.year
+        mediainfo.tmdb_id = abs(hash((meta.name, meta.year))) % 1000000
+        return mediainfo
+
+    def transfer(self, fileitem: FileItem, meta, mediainfo: MediaInfo, target_directory, **kwargs) -> TransferInfo:
+        time.sleep(self._latency.transfer)
+        self._counter.incr("transfer")
+        folder = self._target / mediainfo.title_year
+        if mediainfo.type == MediaType.TV:
+            folder = folder / f"Season {meta.begin_season or 1}"
+        target = folder / fileitem.name
+        return TransferInfo(success=True,
+                            fileitem=fileitem,
+                            target_diritem=FileItem(storage="local", type="dir", path=str(folder) + "/",
+                                                    name=folder.name),
+                            target_item=FileItem(storage="local", type="file", path=str(target),
+                                                 name=target.name, size=fileitem.size),
+                            transfer_type=target_directory.transfer_type,
+                            file_list=[fileitem.path],
+                            file_list_new=[str(target)],
+                            total_size=fileitem.size or 0,
+                            file_count=1)
+
+
+class StubTmdbChain:
+    def __init__(self, latency: Latency, counter: Counter):
+        self._latency = latency
+        self._counter = counter
+
+    def tmdb_episodes(self, tmdbid: int, season: int) -> List[TmdbEpisode]:
+        time.sleep(self._latency.episodes)
+        self._counter.incr("tmdb_episodes")
+        # 覆盖生成的全部集数，与真实数据一样可被缓存
+        return [TmdbEpisode(season_number=season, episode_number=episode, name=f"第 {episode} 集")
+                for episode in range(1, 40)]
+
+
+class StubMediaChain:
+    def __init__(self, latency: Latency, counter: Counter):
+        self._latency = latency
+        self._counter = counter
+
+    def scrape_metadata(self, **kwargs):
+        time.sleep(self._latency.scrape)
+        self._counter.incr("scrape_metadata")
+
+
+class StubStorageChain:
+    @staticmethod
+    def get_file_item(storage: str, path: Path) -> Optional[FileItem]:
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        return FileItem(storage=storage, type="file", path=str(path), name=path.name, basename=path.stem,
+                        extension=path.suffix[1:], size=stat.st_size, modify_time=stat.st_mtime)
+
+
+class StubTransferChain:
+    @staticmethod
+    def send_transfer_message(**kwargs):
+        pass
+
+
+class StubDirectoryHelper:
+    @staticmethod
+    def get_dir(*args, **kwargs):
+        # 不使用系统目录设置，按监控目录配置整理
+        return None
+
+
+class StubQuery:
+    @staticmethod
+    def yield_per(count: int):
+        return iter(())
+
+    def filter(self, *args):
+        return self
+
+    @staticmethod
+    def delete(**kwargs):
+        return 0
+
+
+def make_session(latency: Latency, counter: Counter):
+    class StubSession:
+        """
+        替代数据库会话，整理历史不写入数据库，每次提交计一次写入
+        """
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            return False
+
+        @staticmethod
+        def query(*args):
+            return StubQuery()
+
+        @staticmethod
+        def add_all(rows: list):
+            for row in rows:
+                counter.incr("history_success" if row.status else "history_fail")
+
+        @staticmethod
+        def commit():
+            time.sleep(latency.db)
+            counter.incr("history_commit")
+
+    return StubSession
+
+
+def make_history_oper(latency: Latency, counter: Counter):
+    class StubTransferHistoryOper:
+        """
+        替代整理历史，查询均未命中，写入只计数
+        """
+
+        def __init__(self, db=None):
+            pass
+
+        @staticmethod
+        def get_by_src(src: str):
+            time.sleep(latency.db)
+            return None
+
+        @staticmethod
+        def get_by_type_tmdbid(**kwargs):
+            time.sleep(latency.db)
+            return None
+
+        @staticmethod
+        def add_success(**kwargs):
+            time.sleep(latency.db)
+            counter.incr("history_success")
+
+        @staticmethod
+        def add_fail(**kwargs):
+            time.sleep(latency.db)
+            counter.incr("history_fail")
+            return type("History", (), {"id": 0})()
+
+    return StubTransferHistoryOper
+
+
+class StubHistoryCollector:
+    """
+    替代整理历史收集器，只生成带状态的记录，由会话在提交时计数
+    """
+
+    def __init__(self):
+        self.rows: List[Any] = []
+
+    def add_success(self, **kwargs):
+        self.rows.append(type("History", (), {"status": True})())
+
+    def add_fail(self, **kwargs):
+        self.rows.append(type("History", (), {"status": False})())
+
+
+class StubEventManager:
+    def __init__(self, counter: Counter):
+        self._counter = counter
+
+    def send_event(self, etype, data: dict = None):
+        self._counter.incr("events")
+
+
+class StubSystemConfig:
+    @staticmethod
+    def get(key):
+        return None
+
+
+class StubMessageQueue:
+    @staticmethod
+    def put(*args, **kwargs):
+        pass
+
+
+def create_plugin(module, latency: Latency, counter: Counter, target: Path):
+    """
+    替换插件模块中的依赖，不经过插件管理器创建插件实例
+    """
+    module.TransferHistoryOper = make_history_oper(latency, counter)
+    module.HistoryCollector = StubHistoryCollector
+    module.DownloadHistoryOper = lambda *args, **kwargs: None
+    module.TransferChain = StubTransferChain
+    module.TmdbChain = lambda: StubTmdbChain(latency, counter)
+    module.MediaChain = lambda: StubMediaChain(latency, counter)
+    module.StorageChain = StubStorageChain
+    module.FileManagerModule = lambda: None
+    module.DirectoryHelper = StubDirectoryHelper
+    module.SessionFactory = make_session(latency, counter)
+
+    plugin = module.CloudLinkMonitor.__new__(module.CloudLinkMonitor)
+    plugin.chain = StubChain(latency, counter, target)
+    plugin.eventmanager = StubEventManager(counter)
+    plugin.systemconfig = StubSystemConfig()
+    plugin.systemmessage = StubMessageQueue()
+    data: Dict[str, Any] = {}
+    plugin.get_data = lambda key=None, **kwargs: data.get(key)
+    plugin.save_data = lambda key, value, **kwargs: data.__setitem__(key, value)
+    plugin.update_config = lambda config, **kwargs: True
+    plugin.get_config = lambda *args, **kwargs: {}
+    plugin.post_message = lambda *args, **kwargs: counter.incr("messages")
+    return plugin
+
+
+def run(args) -> dict:
+    # 只清理自动创建的临时目录
+    cleanup = not args.root and not args.keep
+    workdir = Path(args.root or tempfile.mkdtemp(prefix="cloudlinkmonitor-bench-"))
+    source = workdir / "source"
+    target = workdir / "library"
+    source.mkdir(parents=True, exist_ok=True)
+    try:
+        files = build_tree(source, files=args.files, movie_ratio=args.movie_ratio,
+                           file_size=args.file_size, seed=args.seed)
+        latency = Latency(recognize=args.recognize_latency, episodes=args.episodes_latency,
+                          transfer=args.transfer_latency, scrape=args.scrape_latency, db=args.db_latency)
+        counter = Counter()
+        module = load_plugin_module()
+        plugin = create_plugin(module, latency=latency, counter=counter, target=target)
+        if args.tracemalloc:
+            tracemalloc.start()
+        # 未指定频率时不限速，只指定频率时突发次数使用插件默认值
+        recognize_rate = args.recognize_rate or 1000000
+        recognize_burst = args.recognize_burst or (8 if args.recognize_rate else 1000000)
+        # 只运行一次同步，不启动目录监控与补偿扫描
+        plugin.init_plugin({
+            "enabled": False,
+            "onlyonce": True,
+            "mode": "fast",
+            "transfer_type": "copy",
+            "monitor_dirs": f"{source}:{target}",
+            "history": True,
+            "scrape": args.scrape,
+            "refresh": True,
+            "notify": False,
+            "workers": args.workers,
+            "observer_threads": 1,
+            "recognize_rate": recognize_rate,
+            "recognize_burst": recognize_burst,
+        })
+        # 由下面直接调用同步并计时，移除插件安排的立即运行任务
+        if plugin._scheduler:
+            plugin._scheduler.remove_all_jobs()
+
+        start = time.perf_counter()
+        plugin.sync_all(full=True)
+        elapsed = time.perf_counter() - start
+
+        peak_traced = None
+        if args.tracemalloc:
+            _, peak_traced = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        stages = plugin._stats.summary() if plugin._stats else {}
+        caches = {
+            "recognize": plugin._recognize_cache.stats(),
+            "episodes": plugin._episodes_cache.stats(),
+            "title": plugin._title_cache.stats(),
+        }
+        plugin.stop_service()
+        # Linux下ru_maxrss单位为KB
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return {
+            "files": files,
+            "workers": args.workers,
+            "recognize_rate": args.recognize_rate or None,
+            "recognize_burst": recognize_burst if args.recognize_rate else None,
+            "elapsed": round(elapsed, 3),
+            "files_per_sec": round(files / elapsed, 1) if elapsed else None,
+            "peak_rss_mb": round(peak_rss / 1024 ** 2, 1),
+            "peak_traced_mb": round(peak_traced / 1024 ** 2, 1) if peak_traced is not None else None,
+            "calls": counter.values,
+            "caches": caches,
+            "stages": stages,
+        }
+    finally:
+        if cleanup:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_report(result: dict):
+    print(f"文件数：{result['files']}  线程数：{result['workers']}  耗时：{result['elapsed']}s  "
+          f"速度：{result['files_per_sec']} 文件/秒")
+    print("识别限速：" + (f"{result['recognize_rate']} 次/秒，突发 {result['recognize_burst']} 次"
+                        if result["recognize_rate"] else "不限速"))
+    print(f"内存峰值：RSS {result['peak_rss_mb']} MB"
+          + (f"，Python分配 {result['peak_traced_mb']} MB" if result["peak_traced_mb"] is not None else ""))
+    print("调用次数：" + "，".join(f"{name} {count}" for name, count in sorted(result["calls"].items())))
+    print("缓存命中：" + "，".join(f"{name} {stats.get('hits')}/{stats.get('hits', 0) + stats.get('misses', 0)}"
+                               for name, stats in result["caches"].items()))
+    headers = ["阶段", "次数", "失败", "平均(ms)", "P50(ms)", "P95(ms)", "P99(ms)"]
+    rows: List[list] = [[stage, item.get("count"), item.get("errors"), item.get("avg"),
+                         item.get("p50"), item.get("p95"), item.get("p99")]
+                        for stage, item in result["stages"].items()]
+    widths = [max(len(str(row[i])) for row in [headers] + rows) for i in range(len(headers))]
+    for row in [headers] + rows:
+        print("  ".join(str(value).ljust(width) for value, width in zip(row, widths)))
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="云盘实时监控性能测试")
+    parser.add_argument("--files", type=int, default=1000, help="生成的文件数")
+    parser.add_argument("--workers", type=int, default=4, help="转移线程数")
+    parser.add_argument("--movie-ratio", type=float, default=0.2, help="电影占比")
+    parser.add_argument("--file-size", type=int, default=1024 ** 2, help="文件大小（字节，稀疏文件）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--recognize-latency", type=float, default=0.2, help="识别媒体信息延迟（秒）")
+    parser.add_argument("--episodes-latency", type=float, default=0.1, help="获取集信息延迟（秒）")
+    parser.add_argument("--transfer-latency", type=float, default=0.05, help="转移文件延迟（秒）")
+    parser.add_argument("--scrape-latency", type=float, default=0.1, help="刮削延迟（秒）")
+    parser.add_argument("--db-latency", type=float, default=0.002, help="整理历史读写延迟（秒）")
+    parser.add_argument("--recognize-rate", type=float, default=0, help="识别请求每秒次数，0为不限速")
+    parser.add_argument("--recognize-burst", type=int, default=0, help="识别请求突发次数，默认8，不限速时无效")
+    parser.add_argument("--no-scrape", dest="scrape", action="store_false", help="不刮削")
+    parser.add_argument("--tracemalloc", action="store_true", help="统计Python内存分配峰值（会降低速度）")
+    parser.add_argument("--root", help="测试目录，默认使用临时目录，指定时不会删除")
+    parser.add_argument("--keep", action="store_true", help="保留临时测试目录")
+    parser.add_argument("--json", action="store_true", help="以JSON输出结果")
+    args = parser.parse_args(argv)
+
+    result = run(args)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_report(result)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,11 @@
+import posixpath
+import random
+import threading
 import time
-from typing import List, Tuple, Dict, Any
-from apscheduler.triggers.interval import IntervalTrigger  # 修改1：导入IntervalTrigger
+from typing import List, Tuple, Dict, Any, Optional, Iterable, Callable
+
+import requests
+from requests.adapters import HTTPAdapter
 
 from app.core.config import settings
 from app.core.event import eventmanager, Event  # 需要导入Event
@@ -10,6 +15,212 @@ from app.log import logger
 from app.plugins import _PluginBase
 
 
+class CircuitBreaker:
+    """
+    熔断器：连续失败达到阈值后暂停调用，冷却后放行一次探测，探测成功恢复，失败则冷却时间加倍
+    """
+
+    def __init__(self, threshold: int = 3, cooldown: float = 60, max_cooldown: float = 600):
+        self._threshold = threshold
+        self._base_cooldown = cooldown
+        self._max_cooldown = max_cooldown
+        self._cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._open_until = 0.0
+
+    def is_open(self) -> bool:
+        return self._failures >= self._threshold
+
+    def remaining(self) -> float:
+        """
+        距离下次允许调用的秒数
+        """
+        if not self.is_open():
+            return 0
+        return max(self._open_until - time.monotonic(), 0)
+
+    def allow(self) -> bool:
+        """
+        是否允许调用，熔断期间冷却结束后只放行一次探测
+        """
+        with self._lock:
+            if self._failures < self._threshold:
+                return True
+            now = time.monotonic()
+            if now < self._open_until:
+                return False
+            # 探测期间不再放行其它调用
+            self._open_until = now + self._cooldown
+            return True
+
+    def success(self) -> bool:
+        """
+        记录成功
+        :return: 是否从熔断中恢复
+        """
+        with self._lock:
+            recovered = self._failures >= self._threshold
+            self._failures = 0
+            self._cooldown = self._base_cooldown
+            return recovered
+
+    def failure(self) -> float:
+        """
+        记录失败
+        :return: 进入熔断时返回冷却时间，否则返回0
+        """
+        with self._lock:
+            self._failures += 1
+            if self._failures < self._threshold:
+                return 0
+            if self._failures > self._threshold:
+                # 探测失败
+                self._cooldown = min(self._cooldown * 2, self._max_cooldown)
+            self._open_until = time.monotonic() + self._cooldown
+            return self._cooldown
+
+
+class PendingLedger:
+    """
+    待通知记录，线程安全：目录 -> 最后一次事件序号，未知路径的事件记为全量同步。
+    通知成功后只清除通知时已记录的事件；变化只标记，由flush在定时器到期及停止时通过persist保存，不在事件中写库
+    """
+
+    def __init__(self, data: Optional[dict], persist: Callable[[dict], Any]):
+        data = data or {}
+        self._lock = threading.Lock()
+        # 保存串行执行，避免旧数据覆盖新数据
+        self._flush_lock = threading.Lock()
+        self._persist = persist
+        self._dirty = False
+        self._seq: int = data.get("seq") or 0
+        self._paths: Dict[str, int] = dict(data.get("paths") or {})
+        # 最后一次需要全量同步的事件序号，0表示不需要
+        self._full: int = data.get("full") or 0
+
+    def add(self, paths: Iterable[Optional[str]]):
+        """
+        记录一个事件
+        :param paths: 需要同步的目录，None表示未知
+        """
+        with self._lock:
+            self._seq += 1
+            for path in paths:
+                if path:
+                    self._paths[path.rstrip("/") or "/"] = self._seq
+                else:
+                    self._full = self._seq
+            self._dirty = True
+
+    def snapshot(self) -> Tuple[int, List[str], bool]:
+        """
+        :return: 当前序号、待同步目录、是否需要全量同步
+        """
+        with self._lock:
+            return self._seq, list(self._paths.keys()), bool(self._full)
+
+    def clear(self, seq: int):
+        """
+        清除序号不超过seq的事件
+        """
+        with self._lock:
+            self._paths = {path: last for path, last in self._paths.items() if last > seq}
+            if self._full <= seq:
+                self._full = 0
+            self._dirty = True
+
+    def pending(self) -> bool:
+        return bool(self._paths or self._full)
+
+    def flush(self):
+        """
+        有变化时保存，持锁期间只复制数据
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = {"seq": self._seq, "paths": dict(self._paths), "full": self._full}
+                self._dirty = False
+            try:
+                self._persist(data)
+            except Exception as e:
+                logger.error(f"保存待通知记录失败：{str(e)}")
+                with self._lock:
+                    self._dirty = True
+
+
+class DebounceTimer:
+    """
+    防抖定时器：首个事件开始计时，静默期内有新事件则顺延，最长不超过最大延迟，到期只触发一次；空闲时不唤醒
+    """
+
+    def __init__(self, callback, quiet: float, max_delay: float):
+        self._callback = callback
+        self._quiet = quiet
+        self._max_delay = max_delay
+        self._cond = threading.Condition()
+        # 本轮首个事件时间、到期时间
+        self._first: Optional[float] = None
+        self._due: Optional[float] = None
+        self._stopped = False
+        self._thread = threading.Thread(target=self.__run, name="cmsnotify-debounce", daemon=True)
+        self._thread.start()
+
+    def touch(self):
+        """
+        有新事件
+        """
+        with self._cond:
+            now = time.monotonic()
+            if self._first is None:
+                self._first = now
+            self._due = min(now + self._quiet, self._first + self._max_delay)
+            self._cond.notify()
+
+    def retry(self, delay: float):
+        """
+        触发失败，延迟后重新触发
+        """
+        with self._cond:
+            now = time.monotonic()
+            self._first = now
+            self._due = now + delay
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def __wait(self) -> bool:
+        """
+        等待到期
+        :return: 是否到期，停止时返回False
+        """
+        with self._cond:
+            while not self._stopped:
+                if self._due is None:
+                    self._cond.wait()
+                    continue
+                timeout = self._due - time.monotonic()
+                if timeout > 0:
+                    self._cond.wait(timeout)
+                    continue
+                self._first = None
+                self._due = None
+                return True
+            return False
+
+    def __run(self):
+        while self.__wait():
+            try:
+                self._callback()
+            except Exception as e:
+                logger.error(f"CMS通知异常：{str(e)}")
+
+
 class CMSNotify(_PluginBase):
     # 插件名称
     plugin_name = "CMS通知"
@@ -18,7 +229,7 @@ class CMSNotify(_PluginBase):
     # 插件图标
     plugin_icon = "https://raw.githubusercontent.com/imaliang/MoviePilot-Plugins/main/icons/cms.png"
     # 插件版本
-    plugin_version = "0.6"  # 修改版本号
+    plugin_version = "1.3"  # 修改版本号
     # 插件作者
     plugin_author = "fromimaliang"
     # 作者主页
@@ -35,9 +246,21 @@ class CMSNotify(_PluginBase):
     _cms_domain = None
     _cms_api_token = None
     _enabled = False
-    _last_event_time = 0
-    _wait_notify_count = 0
-    _last_check_time = 0  # 修改3：新增最后检查时间记录
+    # 待通知记录，重启后继续通知
+    _ledger: Optional[PendingLedger] = None
+    # 复用连接的会话，随插件启停
+    _session: Optional[requests.Session] = None
+    # 连接、读取超时（秒）
+    _timeout = (5, 15)
+    # 失败重试次数及退避基数（秒）
+    _retries = 2
+    _backoff = 1
+    # CMS熔断器
+    _breaker: Optional[CircuitBreaker] = None
+    # 通知防抖：静默时间、最长延迟（秒）
+    _quiet_seconds = 10
+    _max_delay = 60
+    _timer: Optional[DebounceTimer] = None
 
     def init_plugin(self, config: dict = None):
         if config:
@@ -45,20 +268,29 @@ class CMSNotify(_PluginBase):
             self._cms_notify_type = config.get("cms_notify_type")
             self._cms_domain = config.get("cms_domain")
             self._cms_api_token = config.get('cms_api_token')
+            self._quiet_seconds = self.__number(config.get("quiet_seconds"), 10.0)
+            self._max_delay = max(self.__number(config.get("max_delay"), 60.0), self._quiet_seconds)
+
+        self.stop_service()
+        self._ledger = PendingLedger(self.get_data("pending"), persist=lambda data: self.save_data("pending", data))
+        if self._enabled:
+            self._session = requests.Session()
+            self._session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+            self._session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+            self._breaker = CircuitBreaker()
+            self._timer = DebounceTimer(callback=self.__notify_cms, quiet=self._quiet_seconds,
+                                        max_delay=self._max_delay)
+            if self._ledger.pending():
+                logger.info("存在上次未完成的CMS通知，稍后重新通知")
+                self._timer.touch()
 
     def get_state(self) -> bool:
         return self._enabled
 
     def get_service(self) -> List[Dict[str, Any]]:
-        """ 修改4：关键改动 - 将CronTrigger改为IntervalTrigger """
-        if self._enabled:
-            return [{
-                "id": "CMSNotify",
-                "name": "CMS通知",
-                "trigger": IntervalTrigger(seconds=10),  # 每10秒检查一次
-                "func": self.__notify_cms,
-                "kwargs": {}
-            }]
+        """
+        通知由事件触发的防抖定时器发送，不注册定时服务
+        """
         return []
 
     @staticmethod
@@ -157,6 +389,45 @@ class CMSNotify(_PluginBase):
                             }
                         ]
                     },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'quiet_seconds',
+                                            'label': '静默时间（秒）',
+                                            'placeholder': '10'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'max_delay',
+                                            'label': '最长延迟（秒）',
+                                            'placeholder': '60'
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
                     {
                         'component': 'VRow',
                         'content': [
@@ -213,7 +484,7 @@ class CMSNotify(_PluginBase):
                                         'props': {
                                             'type': 'info',
                                             'variant': 'tonal',
-                                            'text': '精准20秒等待机制：每10秒检查一次，满足20秒间隔即触发通知'
+                                            'text': '首个整理事件后等待静默时间，期间有新事件则顺延，最长不超过最长延迟，到期通知一次'
                                         }
                                     }
                                 ]
@@ -226,46 +497,68 @@ class CMSNotify(_PluginBase):
             "enabled": False,
             "cms_notify_type": "lift_sync",
             "cms_api_token": "cloud_media_sync",
-            "cms_domain": "http://192.168.2.4:9090"
+            "cms_domain": "http://192.168.2.4:9090",
+            "quiet_seconds": 10,
+            "max_delay": 60
         }
 
     def get_page(self) -> List[dict]:
         pass
 
-    @eventmanager.register(EventType)
+    @eventmanager.register([EventType.TransferComplete, EventType.MetadataScrape])
     def send(self, event):
-        """ 修改6：移除存储类型判断 """
+        """
+        整理完成、刮削完成事件，只读取需要的字段
+        """
         if not self._enabled or not self._cms_domain or not self._cms_api_token:
             return
 
-        if not event or not event.event_type:
+        if not event or not event.event_type or not event.event_data:
             return
 
-        def __to_dict(_event):
-            if isinstance(_event, dict):
-                return {k: __to_dict(v) for k, v in _event.items()}
-            elif isinstance(_event, (list, tuple, set)):
-                return type(_event)(__to_dict(x) for x in _event)
-            elif hasattr(_event, '__dict__'):
-                return __to_dict(_event.__dict__)
-            return _event
-
-        event_type = event.event_type.value if hasattr(event.event_type, 'value') else event.event_type
-        if event_type not in ["transfer.complete", "metadata.scrape"]:
-            return
+        event_data = event.event_data
+        if event.event_type == EventType.TransferComplete:
+            transferinfo = self.__field(event_data, "transferinfo")
+            if not self.__field(transferinfo, "success"):
+                return
+            target_item = self.__field(transferinfo, "target_item")
+            logger.info(f"媒体整理完成：{self.__field(target_item, 'name')}")
+            target_dir = self.__field(self.__field(transferinfo, "target_diritem"), "path")
+            target_file = self.__field(target_item, "path")
+            self.__add_pending([target_dir or (posixpath.dirname(str(target_file)) if target_file else None)])
+        elif event.event_type == EventType.MetadataScrape:
+            fileitem = self.__field(event_data, "fileitem")
+            logger.info(f"媒体刮削完成：{self.__field(event_data, 'name') or self.__field(fileitem, 'name')}")
+            path = self.__field(fileitem, "path")
+            if path and self.__field(fileitem, "type") != "dir":
+                path = posixpath.dirname(str(path))
+            self.__add_pending([str(path) if path else None])
+
+    @staticmethod
+    def __number(value: Any, default):
+        """
+        读取数字配置，为空或不是数字时使用默认值
+        :param value: 配置值
+        :param default: 默认值，结果与默认值类型相同
+        """
+        if value in (None, ""):
+            return default
+        try:
+            return type(default)(value)
+        except (TypeError, ValueError):
+            logger.warn(f"配置值 {value} 不是有效的数字，使用默认值 {default}")
+            return default
 
-        event_data = __to_dict(event.event_data)
-        if event_type == "transfer.complete":
-            if event_data.get("transferinfo", {}).get("success"):
-                name = event_data["transferinfo"]["target_item"]["name"]
-                logger.info(f"媒体整理完成：{name}")
-                self._wait_notify_count += 1
-                self._last_event_time = self.__get_time()
-        elif event_type == "metadata.scrape":
-            name = event_data["name"]
-            logger.info(f"媒体刮削完成：{name}")
-            self._wait_notify_count += 1
-            self._last_event_time = self.__get_time()
+    @staticmethod
+    def __field(obj: Any, name: str) -> Any:
+        """
+        读取字典或对象的字段
+        """
+        if obj is None:
+            return None
+        if isinstance(obj, dict):
+            return obj.get(name)
+        return getattr(obj, name, None)
 
     # ========== 新增：监听cloudlinkmonitor的事件 ==========
     @eventmanager.register(EventType.PluginAction)
@@ -292,35 +585,83 @@ class CMSNotify(_PluginBase):
             
         logger.info(f"cloudlinkmonitor转移完成并触发CMS通知：{name} ({media_type})")
         
-        # 增加等待通知计数
-        self._wait_notify_count += 1
-        self._last_event_time = self.__get_time()
+        # 增加等待通知，记录文件所在目录
+        file_paths = event_data.get("file_paths") or [event_data.get("file_path")]
+        self.__add_pending([posixpath.dirname(path) if path else None for path in file_paths])
     # ========== 新增代码结束 ==========
 
-    def __get_time(self):
-        return int(time.time())
+    def __add_pending(self, paths: Iterable[Optional[str]]):
+        """
+        增加等待通知
+        :param paths: 需要同步的目录，None表示未知
+        """
+        self._ledger.add(paths)
+        if self._timer:
+            self._timer.touch()
 
     def __notify_cms(self):
-        """ 修改7：精准30秒触发逻辑 """
+        """
+        防抖定时器到期，通知CMS同步；失败时按熔断冷却时间或静默时间重新计时
+        """
         try:
-            now = self.__get_time()
-            time_since_last_event = now - self._last_event_time
-            
-            # 调试日志（生产环境可关闭）
-            logger.debug(f"检查通知条件：等待数={self._wait_notify_count}, 时间差={time_since_last_event}s")
-            
-            if self._wait_notify_count > 0 and time_since_last_event > 10:
+            seq, pending_paths, full_lift = self._ledger.snapshot()
+            logger.debug(f"通知CMS：待同步目录数={len(pending_paths)}，全量同步={full_lift}")
+            if pending_paths or full_lift:
+                if not self._breaker.allow():
+                    logger.debug("CMS通知暂停中，等待恢复探测")
+                    self.__retry_later(self._breaker.remaining())
+                    return
+                # 熔断后的探测只请求一次
+                probing = self._breaker.is_open()
                 url = f"{self._cms_domain}/api/sync/lift_by_token?token={self._cms_api_token}&type={self._cms_notify_type}"
-                ret = RequestUtils().get_res(url)
+                ret = self.__get(url, retries=0 if probing else self._retries)
                 if ret:
+                    if self._breaker.success():
+                        logger.info("CMS已恢复")
                     logger.info(f"CMS同步通知成功（类型：{self._cms_notify_type}）")
-                    self._wait_notify_count = 0
-                elif ret is not None:
-                    logger.error(f"通知失败：HTTP {ret.status_code} - {ret.text}")
-                else:
-                    logger.error("通知失败：无响应")
+                    # 只清除本次通知已包含的事件
+                    self._ledger.clear(seq)
+                    return
+                reason = f"HTTP {ret.status_code} - {ret.text}" if ret is not None else "无响应"
+                cooldown = self._breaker.failure()
+                if cooldown:
+                    logger.error(f"通知失败：{reason}，暂停通知 {int(cooldown)} 秒后探测CMS是否恢复")
+                elif not probing:
+                    logger.warn(f"通知失败：{reason}")
+                self.__retry_later(cooldown)
         except Exception as e:
             logger.error(f"通知异常：{str(e)}")
+        finally:
+            # 每次到期保存一次待通知记录
+            self._ledger.flush()
+
+    def __retry_later(self, delay: float):
+        """
+        通知未成功，稍后重新通知，至少等待静默时间
+        """
+        timer = self._timer
+        if timer:
+            timer.retry(max(delay, self._quiet_seconds))
+
+    def __get(self, url: str, retries: int) -> Optional[requests.Response]:
+        """
+        复用会话请求，无响应或服务端错误时按指数退避加随机抖动重试
+        """
+        ret = None
+        for attempt in range(retries + 1):
+            ret = RequestUtils(session=self._session, timeout=self._timeout).get_res(url)
+            if ret is not None and ret.status_code < 500:
+                return ret
+            if attempt < retries:
+                time.sleep(self._backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+        return ret
 
     def stop_service(self):
-        pass
+        if self._timer:
+            self._timer.stop()
+            self._timer = None
+        if self._ledger:
+            self._ledger.flush()
+        if self._session:
+            self._session.close()
+            self._session = None